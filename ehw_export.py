@@ -1,19 +1,26 @@
 #!/usr/bin/env python3
 import sys
 import subprocess
-import importlib
+import importlib.util
 import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import shutil
 import pwd
 import os
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 from openpyxl.formatting.rule import FormulaRule
 import re
-from ehw_transform import build_yearly_view, build_monthly_view
+from ehw_transform import build_yearly_view, build_monthly_view, build_virtual_mapping_by_id, counter_id
 
 import ehw_fix_Images
 
@@ -22,53 +29,99 @@ DEBUG = bool(os.getenv("EHW_DEBUG"))
 DEBUG = DEBUG
 
 # Image management settings
-IMG_MODE = os.getenv("EHW_IMG_MODE", "copy").lower()  # copy | symlink
+IMG_MODE = os.getenv("EHW_IMG_MODE", "hardlink").lower()  # hardlink | copy | symlink
+IMG_WORKERS = 16  # threads writing images per folder
 PRUNE = bool(os.getenv("EHW_PRUNE"))
+# Per-folder workbooks (##<folder>-<ts>.xlsx + <folder>.xlsx); 0 = only the combined ehw+.xlsx
+PER_FOLDER = os.getenv("EHW_PER_FOLDER", "1") == "1"
 
 CONFIG_FILE = "./ehw_export.conf.json"
 MAX_XLSX_FILES = 10
 
 # === Automatische Paketinstallation ===
+# pandas/openpyxl are imported at the top of this file, so a missing one fails before
+# any check here could run; ensure_package is kept for manual use (e.g. optional extras).
 def ensure_package(pkg):
-    try:
-        importlib.import_module(pkg)
-    except ImportError:
+    # find_spec only locates the package; nothing is imported just to check for it
+    if importlib.util.find_spec(pkg) is None:
         print(f"[INFO] Installiere fehlendes Paket: {pkg}")
         subprocess.check_call([sys.executable, "-m", "pip", "install", pkg])
 
-for package in ["pandas", "openpyxl"]:
-    ensure_package(package)
+# Optional fast JSON parser for the (large) per-folder dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Datum & Werte Parsing ---
-def parse_date_variants(date_str):
-    if not date_str:
-        return "", "", "", ""
-    try:
-        dt = datetime.fromisoformat(date_str.replace("Z", ""))
-        if dt.hour == 0 and dt.minute == 0:
-            orig = dt.strftime("%d.%m.%Y")
-        else:
-            orig = dt.strftime("%d.%m.%Y %H:%M")
-        return orig, dt.strftime("%Y"), dt.strftime("%Y-%m"), dt.strftime("%Y-%m-%d")
-    except Exception:
-        return date_str, "", "", ""
-
-def parse_value_numeric(val):
-    if val is None:
-        return None
-    try:
-        num_str = re.sub(r"[^0-9,.\-]", "", str(val)).replace(",", ".")
-        return float(num_str) if num_str else None
-    except ValueError:
-        return None
+# trailing UTC offset (+01:00, -0500, +02) after the time part of an ISO date
+_ISO_OFFSET_RE = re.compile(r"([T ]\d{2}[\d:.,]*)[+-]\d{2}(?::?\d{2})?$")
+
+def parse_date_series(dates: pd.Series) -> pd.DataFrame:
+    """Parse a whole column of ISO date strings ('Z' suffix allowed).
+    Returns a DataFrame with Date_Orig ("dd.mm.YYYY", plus " HH:MM" when there is a time),
+    Date_Year, Date_YearMonth, Date_Full (strings; unparsable dates keep their text in
+    Date_Orig and get "" elsewhere).
+    """
+    raw = dates.where(dates.notna(), "").astype(str)
+    # Local wall-clock time like fromisoformat: drop 'Z' and any UTC offset, otherwise
+    # dates with different offsets (DST) make to_datetime raise instead of coerce
+    local = raw.str.replace("Z", "", regex=False).str.replace(_ISO_OFFSET_RE, r"\1", regex=True)
+    dt = pd.to_datetime(local, errors="coerce", format="ISO8601")
+    has_time = (dt.dt.hour != 0) | (dt.dt.minute != 0)
+    orig = dt.dt.strftime("%d.%m.%Y %H:%M").where(has_time, dt.dt.strftime("%d.%m.%Y"))
+    valid = dt.notna()
+    return pd.DataFrame({
+        "Date_Orig": orig.where(valid, raw),
+        "Date_Year": dt.dt.strftime("%Y").where(valid, ""),
+        "Date_YearMonth": dt.dt.strftime("%Y-%m").where(valid, ""),
+        "Date_Full": dt.dt.strftime("%Y-%m-%d").where(valid, ""),
+    })
+
+def parse_value_series(values: pd.Series) -> pd.Series:
+    """Numeric reading from the raw values: keeps digits, ',', '.', '-' and reads ',' as
+    decimal point; unparsable values become NaN."""
+    num_str = (
+        values.astype(str)
+        .str.replace(r"[^0-9,.\-]", "", regex=True)
+        .str.replace(",", ".", regex=False)
+    )
+    return pd.to_numeric(num_str, errors="coerce")
+
+# Text columns that repeat per counter: stored as category codes instead of one str object per row
+CATEGORY_COLS = ["Object", "Room", "CounterName", "CounterType", "CounterUnit", "CounterId", "RoomId"]
+DATE_STR_COLS = ["Date_Full", "Date_Year", "Date_YearMonth"]
+STRING_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "string"
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert CATEGORY_COLS to category and still-textual DATE_STR_COLS to STRING_DTYPE (in place)."""
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in DATE_STR_COLS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].astype(STRING_DTYPE)
+    return df
 
 import re as _re
+import functools
 
+_SAFE_NAME_RE = _re.compile(r"[\\/|:*?\"<>]")
+
+@functools.lru_cache(maxsize=4096)
 def safe_name(s: str) -> str:
-    """Sanitize names for filesystem paths."""
+    """Sanitize names for filesystem paths (cached: the same object/room/counter names repeat per entry)."""
     if s is None:
         return "unknown"
-    return _re.sub(r"[\\/|:*?\"<>]", "_", str(s)).strip()
+    return _SAFE_NAME_RE.sub("_", str(s)).strip()
+
+@functools.lru_cache(maxsize=4096)
+def extract_prefix(name: str) -> str:
+    """Object prefix of a room/counter name: text before the first '.', else before the first '-'."""
+    for delim in ('.', '-'):
+        if delim in name:
+            return name.split(delim, 1)[0]
+    return name
 
 def resolve_room_and_object(counter: dict, room_map: dict) -> tuple[str | None, str | None]:
     """
@@ -79,13 +132,6 @@ def resolve_room_and_object(counter: dict, room_map: dict) -> tuple[str | None,
     room_name = room_map.get(room_id)
     cn = (counter.get("counterName") or "").strip()
 
-    # Helper to extract prefix from a name using . or -
-    def extract_prefix(name: str) -> str:
-        for delim in ('.', '-'):
-            if delim in name:
-                return name.split(delim, 1)[0]
-        return name
-
     if room_name:
         object_name = extract_prefix(room_name)
     else:
@@ -96,49 +142,65 @@ def resolve_room_and_object(counter: dict, room_map: dict) -> tuple[str | None,
 # --- Canonical index builder for hidden store ---
 import os as _os
 import re as _re2
+from collections import defaultdict
 
 # Build an index of images in the hidden canonical store, supporting multiple layouts:
 # 1) flat:   <root>/<obj_uuid>_<room_uuid>_<filename>
 # 2) nested: <root>/<obj_uuid>/<room_uuid>/<filename>
 # 3) minimal (fallback): <root>/<filename>
-CANON_FLAT_RE = _re2.compile(r"^(?P<obj>[0-9a-f\-]{8,})_(?P<room>[0-9a-f\-]{8,})_(?P<file>.+)$", _re2.IGNORECASE)
+CANON_FLAT_RE = _re2.compile(r"(?P<obj>[0-9a-f\-]{8,})_(?P<room>[0-9a-f\-]{8,})_(?P<file>.+)", _re2.ASCII | _re2.IGNORECASE)
 
 def build_canonical_index(canonical_root: Path) -> dict:
-    idx = {
-        "by_tuple": {},      # (obj_uuid, room_uuid, file) -> Path
-        "by_room_file": {},  # (room_uuid, file) -> list[Path]
-        "by_file": {},       # file -> list[Path]
+    # Values are path strings; only the few that are looked up become Path objects.
+    # UUIDs repeat in thousands of keys, so they are interned.
+    by_tuple = {}                   # (obj_uuid, room_uuid, file) -> str
+    by_room_file = defaultdict(list)  # (room_uuid, file) -> list[str]
+    by_file = defaultdict(list)       # file -> list[str]
+    if canonical_root.exists():
+        # Depth-first scandir walk (same order as os.walk top-down), DirEntry types are
+        # taken from readdir so no extra stat per entry; hidden sub-directories are skipped.
+        stack = [(str(canonical_root), ())]
+        while stack:
+            dirpath, parts = stack.pop()
+            # Case 2 and 3: nested or minimal
+            obj_uuid = parts[0] if len(parts) >= 1 else None
+            room_uuid = parts[1] if len(parts) >= 2 else None
+            subdirs = []
+            with _os.scandir(dirpath) as it:
+                for entry in it:
+                    fn = entry.name
+                    if entry.is_dir():
+                        if not entry.is_symlink() and not fn.startswith("."):
+                            subdirs.append((entry.path, parts + (sys.intern(fn),)))
+                        continue
+                    p = entry.path
+                    # flat names need two '_' separators; skip the regex for everything else
+                    m = CANON_FLAT_RE.fullmatch(fn) if "_" in fn else None
+                    if m:
+                        o, r, f = m.groups()
+                        o = sys.intern(o); r = sys.intern(r)
+                        by_tuple[(o, r, f)] = p
+                        by_room_file[(r, f)].append(p)
+                        by_file[f].append(p)
+                        continue
+                    # nested case
+                    f = fn
+                    if obj_uuid and room_uuid:
+                        by_tuple[(obj_uuid, room_uuid, f)] = p
+                        by_room_file[(room_uuid, f)].append(p)
+                    # minimal fallback
+                    by_file[f].append(p)
+            stack.extend(reversed(subdirs))
+    return {
+        "by_tuple": by_tuple,
+        "by_room_file": dict(by_room_file),
+        "by_file": dict(by_file),
     }
-    if not canonical_root.exists():
-        return idx
-    for dirpath, _dirs, files in _os.walk(canonical_root):
-        dpath = Path(dirpath)
-        # Case 2 and 3: nested or minimal
-        parts = dpath.relative_to(canonical_root).parts
-        obj_uuid = parts[0] if len(parts) >= 1 and parts[0] else None
-        room_uuid = parts[1] if len(parts) >= 2 and parts[1] else None
-        for fn in files:
-            p = dpath / fn
-            m = CANON_FLAT_RE.match(fn)
-            if m:
-                o = m.group("obj"); r = m.group("room"); f = m.group("file")
-                idx["by_tuple"][(o, r, f)] = p
-                idx["by_room_file"].setdefault((r, f), []).append(p)
-                idx["by_file"].setdefault(f, []).append(p)
-                continue
-            # nested case
-            f = fn
-            if obj_uuid and room_uuid:
-                idx["by_tuple"][(obj_uuid, room_uuid, f)] = p
-                idx["by_room_file"].setdefault((room_uuid, f), []).append(p)
-            # minimal fallback
-            idx["by_file"].setdefault(f, []).append(p)
-    return idx
 
 from pathlib import Path as _Path
 import shutil as _shutil
 
-def copy_canonical_image(
+def resolve_canonical_image(
     local_image_file_name: str | None,
     canonical_root: Path,
     object_uuid: str | None,
@@ -149,10 +211,13 @@ def copy_canonical_image(
     date_full: str | None,
     visible_root: Path,
     verbose: bool = False,
-    canon_idx: dict | None = None
-) -> Path | None:
-    """Copy or symlink from <target>/.<folder>/<obj>_<room>_<file> to <target>/<folder>/<Object>/<Room>/<file>.
-    Returns dest path as Path or None if source doesn't exist or no filename.
+    canon_idx: dict | None = None,
+    ensured_dirs: set | None = None
+) -> tuple[Path, Path] | None:
+    """Find the canonical source <target>/.<folder>/<obj>_<room>_<file> and the visible dest
+    <target>/<folder>/<Object>/<Room>/<file>; creates the dest dir but does not write the file.
+    Returns (src, dest) or None if source doesn't exist or no filename.
+    ensured_dirs: optional set of already created dest dirs, shared across calls to skip repeated mkdir.
     """
     if not local_image_file_name or not object_uuid or not room_uuid:
         return None
@@ -173,72 +238,137 @@ def copy_canonical_image(
         # Legacy flat name fallback
         canonical_name = f"{object_uuid}_{room_uuid}_{file_name}"
         src = canonical_root / canonical_name
+    src = Path(src)
     if verbose:
         print(f"[IMG] try src={src}")
-    if not src or not Path(src).exists():
+    if not src.exists():
         if verbose:
             print(f"[IMG] missing: {src}")
         return None
     dest_dir = visible_root / safe_name(object_name) / safe_name(room_name)
-    if verbose:
-        print(f"[IMG] ensure dest_dir={dest_dir}")
-    dest_dir.mkdir(parents=True, exist_ok=True)
+    if ensured_dirs is None or dest_dir not in ensured_dirs:
+        if verbose:
+            print(f"[IMG] ensure dest_dir={dest_dir}")
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        if ensured_dirs is not None:
+            ensured_dirs.add(dest_dir)
     safe_counter = safe_name(counter_name) if counter_name else "unknown"
     safe_date = date_full.replace("-", "") if date_full else "nodate"
     new_name = f"{safe_counter}_{safe_date}_{file_name}"
-    dest = dest_dir / new_name
-    if not dest.exists():
-        if IMG_MODE == "symlink":
+    return src, dest_dir / new_name
+
+def materialize_image(src: Path, dest: Path, verbose: bool = False) -> None:
+    """Copy, symlink or hardlink src to dest according to IMG_MODE (no-op if dest exists).
+    A hardlink shares the inode, so it keeps the source's metadata just like copy2 does.
+    Only file syscalls, so safe to run from worker threads."""
+    # Links fail atomically with FileExistsError, so they need no separate exists() stat;
+    # copy2 would silently overwrite, so the copy mode keeps the check.
+    if IMG_MODE not in ("symlink", "hardlink"):
+        if dest.exists():
             if verbose:
-                print(f"[IMG] symlink {src} -> {dest}")
+                print(f"[IMG] exists: {dest}")
+            return
+        if verbose:
+            print(f"[IMG] copy {src} -> {dest}")
+        _shutil.copy2(src, dest)
+        return
+    try:
+        if IMG_MODE == "symlink":
             dest.symlink_to(src)
         else:
-            if verbose:
-                print(f"[IMG] copy {src} -> {dest}")
-            _shutil.copy2(src, dest)
-    else:
+            try:
+                _os.link(src, dest)
+            except FileExistsError:
+                raise
+            except OSError:
+                # e.g. canonical store on another filesystem: fall back to a real copy
+                _shutil.copy2(src, dest)
+    except FileExistsError:
         if verbose:
             print(f"[IMG] exists: {dest}")
-    return dest
+        return
+    if verbose:
+        print(f"[IMG] {IMG_MODE} {src} -> {dest}")
+
 # --- Helpers ---
+def load_json_file(path: Path):
+    """Parse a JSON file from raw bytes, with orjson if installed (stdlib json otherwise)."""
+    raw = Path(path).read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 def load_config(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_json_file(path)
 
 def cleanup_old_excels(folder: Path, prefix: str):
-    files = sorted(folder.glob(f"{prefix}*.xlsx"), key=os.path.getmtime)
+    # one scandir pass; DirEntry.stat() is cached, so each file is stat'ed once
+    with os.scandir(folder) as it:
+        files = sorted(
+            (e.stat().st_mtime, Path(e.path)) for e in it
+            if e.name.startswith(prefix) and e.name.endswith(".xlsx")
+        )
     while len(files) > MAX_XLSX_FILES:
-        old_file = files.pop(0)
+        _mtime, old_file = files.pop(0)
         try:
             old_file.unlink()
             print(f"[Cleanup] removed {old_file.name}")
         except Exception as e:
             print(f"[WARN] Konnte {old_file} nicht löschen: {e}")
 
-# --- Hauptlogik ---
-ALL_ROWS = []
+def prune_stale_files(root: Path, expected_files) -> None:
+    """EHW_PRUNE: delete every file below root's subdirectories that is not in expected_files.
+    Files directly in root (the workbooks) are left to cleanup_old_excels."""
+    # Expected paths are built under the (already resolved) visible root, so plain
+    # normalized strings can be compared without resolve() syscalls per file.
+    keep = {_os.path.normpath(p) for p in expected_files}
+    removed = 0
+    with _os.scandir(root) as it:
+        stack = [entry.path for entry in it if entry.is_dir() and not entry.is_symlink()]
+    while stack:
+        with _os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        stack.append(entry.path)
+                    continue
+                p = entry.path
+                if p not in keep:
+                    if DEBUG:
+                        print(f"[PRUNE] remove stale: {p}")
+                    try:
+                        _os.unlink(p)
+                        removed += 1
+                    except Exception as e:
+                        print(f"[WARN] prune failed for {p}: {e}")
+    if DEBUG:
+        print(f"[PRUNE] removed {removed} files")
 
+# --- Hauptlogik ---
 def process_folder(sync_dir: Path, target_base_dir: Path):
+    """Export one sync folder; returns its rows and virtual→physical counter mapping for
+    the combined workbook and the image paths it expects for EHW_PRUNE (None if skipped)."""
     json_path = sync_dir / f"{sync_dir.name}.json"
     print("\n----------------------------------------------")
     print(f"Bearbeite Ordner: {sync_dir.name}")
     print("----------------------------------------------")
     if not json_path.exists():
         print(f"[WARN] JSON fehlt: {json_path}")
-        return
+        return None
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_json_file(json_path)
+    # Flatten all entries once and parse dates/values column-wise
+    counters = data.get("counters", [])
+    virtual_to_physical = build_virtual_mapping_by_id(counters)
+    entry_lists = [counter.get("entries", {}).get("entries", []) for counter in counters]
+    flat = [entry for entries in entry_lists for entry in entries]
+    dates = parse_date_series(pd.Series([e.get("date") for e in flat], dtype=object))
+    value_nums = parse_value_series(pd.Series([e.get("value") for e in flat], dtype=object))
     # oldest & newest entry date
-    all_dates = []
-    for c in data.get("counters", []):
-        for e in c.get("entries", {}).get("entries", []):
-            _o,_y,_ym,df = parse_date_variants(e.get("date"))
-            if df:
-                all_dates.append(df)
-    if all_dates:
-        print(f"  Ältester Wert: {min(all_dates)}")
-        print(f"  Neuester Wert: {max(all_dates)}")
+    all_dates = dates["Date_Full"][dates["Date_Full"] != ""]
+    if not all_dates.empty:
+        print(f"  Ältester Wert: {all_dates.min()}")
+        print(f"  Neuester Wert: {all_dates.max()}")
 
     # Map each roomId (UUID) to its cleartext name
     room_map = {}
@@ -249,8 +379,11 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
             room_map[rid] = rname
     # canonical source and visible target roots for images
     object_uuid = data.get("objectId")
+    # Only the counters are used from here on; let the rest of the parsed tree go
+    del data
     canonical_root = target_base_dir / f".{object_uuid}"
-    visible_images_root = target_base_dir
+    # resolved once here, so dest paths built below are absolute without per-file resolve()
+    visible_images_root = target_base_dir.resolve()
     if DEBUG:
         print(f"[DBG] canonical_root={canonical_root}")
         print(f"[DBG] visible_root={visible_images_root}")
@@ -260,91 +393,132 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
         print(f"[DBG] canonical indexed: tuples={len(canon_idx['by_tuple'])} by_room={len(canon_idx['by_room_file'])} by_file={len(canon_idx['by_file'])}")
 
     expected_files: list[Path] = []
-    rows = []
-    for counter in data.get("counters", []):
-        for entry in counter.get("entries", {}).get("entries", []):
-            date_orig, date_year, date_yearmonth, date_full = parse_date_variants(entry.get("date"))
-            value_orig = entry.get("value")
-            value_num = parse_value_numeric(value_orig)
-            # --- QBM/m3 conversion logic ---
-            remark = ""
-            unit_str = str(counter.get("counterUnit", "") or "")
-            # Check for water unit qbm (case-insensitive, also allow in name)
-            if unit_str.lower() == "qbm" or "qbm" in unit_str.lower():
-                if value_num is not None:
-                    value_num = value_num / 1000
-                remark = "qbm/1000 applied"
-            # Resolve human-readable room and object names
-            room_name, object_name = resolve_room_and_object(counter, room_map)
-            dest_path: Path | None = copy_canonical_image(
+    ensured_dirs: set[Path] = set()
+    pending_images: dict[Path, Path] = {}  # dest -> src, written after the entry loop
+    # Counter-level fields are resolved once per counter and repeated over its entries;
+    # only the image lookup needs a per-entry Python loop.
+    counter_fields = {name: [] for name in (
+        "Object", "Room", "CounterName", "CounterType", "CounterUnit", "CounterId", "RoomId", "Bemerkung",
+    )}
+    is_qbm_list = []
+    date_full_col = dates["Date_Full"].to_numpy()
+    bild_abs: list[Path | None] = []
+    pos = 0
+    for counter, entries in zip(counters, entry_lists):
+        room_name, object_name = resolve_room_and_object(counter, room_map)
+        counter_name = counter.get("counterName")
+        counter_unit = counter.get("counterUnit")
+        room_id = counter.get("roomId")
+        # --- QBM/m3 conversion logic ---
+        # Check for water unit qbm (case-insensitive, also allow in name)
+        unit_str = str(counter_unit or "").lower()
+        is_qbm = unit_str == "qbm" or "qbm" in unit_str
+        is_qbm_list.append(is_qbm)
+        # CounterUUID suppressed
+        counter_fields["Object"].append(object_name)
+        counter_fields["Room"].append(room_name)
+        counter_fields["CounterName"].append(counter_name)
+        counter_fields["CounterType"].append(counter.get("counterType"))
+        counter_fields["CounterUnit"].append(counter_unit)
+        counter_fields["CounterId"].append(counter_id(counter))
+        counter_fields["RoomId"].append(room_id)
+        counter_fields["Bemerkung"].append("qbm/1000 applied" if is_qbm else "")
+
+        for entry, date_full in zip(entries, date_full_col[pos:pos + len(entries)]):
+            resolved = resolve_canonical_image(
                 entry.get("localImageFileName"),
                 canonical_root=canonical_root,
                 object_uuid=object_uuid,
-                room_uuid=counter.get("roomId"),
+                room_uuid=room_id,
                 object_name=object_name,
                 room_name=room_name,
-                counter_name=counter.get("counterName"),
+                counter_name=counter_name,
                 date_full=date_full,
                 visible_root=visible_images_root,
                 verbose=DEBUG,
                 canon_idx=canon_idx,
+                ensured_dirs=ensured_dirs,
             )
-            if dest_path:
+            dest_path: Path | None = None
+            if resolved:
+                src_path, dest_path = resolved
+                # same counter/date/file twice -> one write; setdefault keeps the first source
+                pending_images.setdefault(dest_path, src_path)
                 expected_files.append(dest_path)
-                try:
-                    rel = dest_path.relative_to(target_base_dir)
-                except Exception:
-                    rel = dest_path
-                img_link_formula = f'=HYPERLINK("{rel.as_posix()}","Bild")'
-            else:
-                img_link_formula = ""
-
-            # Build row dictionary (CounterUUID suppressed)
-            row = {
-                "Object": object_name,
-                "Room": room_name,
-                "CounterName": counter.get("counterName"),
-                "Bild": "Bild" if dest_path else "",  # text; hyperlink applied later
-                "CounterType": counter.get("counterType"),
-                "CounterUnit": counter.get("counterUnit"),
-                "CounterId": counter.get("counterId"),
-                "RoomId": counter.get("roomId"),
-                "Date_Orig": date_orig,
-                "Date_Year": date_year,
-                "Date_YearMonth": date_yearmonth,
-                "Date_Full": date_full,
-                "Value_Orig": value_orig,
-                "Value_Num": value_num,
-                # --- Placeholders for computed values (to be filled by add_delta_columns) ---
-                "MyPrevValue": None,
-                "MyPrevDate": None,
-                "MyDelta": None,
-                "MyDays": None,
-                "MyPerDay": None,
-                "Bemerkung": remark,
-                "Created": datetime.now().isoformat(),
-            }
-            # store absolute path for post-write hyperlinking
-            if dest_path:
-                row["__BildAbs"] = dest_path.resolve().as_posix()
-            rows.append(row)
+            bild_abs.append(dest_path)
+        pos += len(entries)
+
+    # Write the images: IO-bound syscalls release the GIL, so threads overlap the waits
+    if pending_images:
+        with ThreadPoolExecutor(max_workers=IMG_WORKERS) as ex:
+            list(ex.map(lambda item: materialize_image(item[1], item[0], verbose=DEBUG), pending_images.items()))
+        if IMG_MODE == "symlink":
+            # prune compares link paths, not their targets: keep the canonical sources too
+            expected_files.extend(pending_images.values())
+
+    lengths = [len(entries) for entries in entry_lists]
+    n_rows = len(flat)
+    # raw parsed values stay in value_col for the virtual counters; entry rows get qbm/1000
+    value_col = value_nums.to_numpy(dtype="float64")
+    qbm_rows = np.repeat(np.array(is_qbm_list, dtype=bool), lengths)
+    per_entry = {name: np.repeat(np.array(vals, dtype=object), lengths) for name, vals in counter_fields.items()}
+    df_entries = pd.DataFrame({
+        "Object": per_entry["Object"],
+        "Room": per_entry["Room"],
+        "CounterName": per_entry["CounterName"],
+        "Bild": ["Bild" if p else "" for p in bild_abs],  # text; hyperlink set from __BildAbs while writing
+        "CounterType": per_entry["CounterType"],
+        "CounterUnit": per_entry["CounterUnit"],
+        "CounterId": per_entry["CounterId"],
+        "RoomId": per_entry["RoomId"],
+        "Date_Orig": dates["Date_Orig"].to_numpy(),
+        "Date_Year": dates["Date_Year"].to_numpy(),
+        "Date_YearMonth": dates["Date_YearMonth"].to_numpy(),
+        "Date_Full": date_full_col,
+        "Value_Orig": [e.get("value") for e in flat],
+        "Value_Num": np.where(qbm_rows, value_col / 1000, value_col),
+        # --- Placeholders for computed values (to be filled by add_delta_columns) ---
+        "MyPrevValue": [None] * n_rows,
+        "MyPrevDate": [None] * n_rows,
+        "MyDelta": [None] * n_rows,
+        "MyDays": [None] * n_rows,
+        "MyPerDay": [None] * n_rows,
+        "Bemerkung": per_entry["Bemerkung"],
+        "Created": datetime.now().isoformat(),
+        # absolute path for the Bild hyperlink (helper column, not written to Excel)
+        **({"__BildAbs": [p.as_posix() if p else None for p in bild_abs]} if pending_images else {}),
+    }, index=pd.RangeIndex(n_rows))
 
     # --- Virtual counter processing ---
     # Build lookup of counters by UUID
-    counter_by_uuid = {c.get("uuid"): c for c in data.get("counters", [])}
+    counter_by_uuid = {c.get("uuid"): c for c in counters}
 
     # Extract virtual counters
-    virtual_counters = [c for c in data.get("counters", []) if c.get("counterType") == "VIRTUAL"]
+    virtual_counters = [c for c in counters if c.get("counterType") == "VIRTUAL"]
 
-    # Helper: extract entries as dict date_full -> numeric value
+    # [start, stop) of each counter's entries within the batch-parsed columns
+    entry_spans = {}
+    start = 0
+    for counter, n in zip(counters, lengths):
+        entry_spans[counter.get("uuid")] = (start, start + n)
+        start += n
+
+    # Helper: extract entries as dict date_full -> numeric value (reused from the batch parse)
     def extract_value_map(counter_obj):
-        m = {}
-        for e in counter_obj.get("entries", {}).get("entries", []):
-            _o, _y, _ym, dfull = parse_date_variants(e.get("date"))
-            v = parse_value_numeric(e.get("value"))
-            if dfull and v is not None:
-                m[dfull] = v
-        return m
+        start, stop = entry_spans[counter_obj.get("uuid")]
+        full = date_full_col[start:stop]
+        vals = value_col[start:stop]
+        ok = (full != "") & ~np.isnan(vals)
+        # dict(zip()) keeps the last value of a repeated date, like the per-entry loop did
+        return dict(zip(full[ok], vals[ok].tolist()))
+
+    # Helper: per-date sum over several value maps (missing dates count as 0)
+    def sum_value_maps(maps):
+        if not maps:
+            return pd.Series(dtype=float, index=pd.Index([], dtype=object))
+        return pd.concat([pd.Series(m, dtype=float) for m in maps], axis=1).sum(axis=1)
+
+    virtual_frames = []
 
     # Process each virtual counter
     for vctr in virtual_counters:
@@ -378,9 +552,6 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
         add_maps = [extract_value_map(c) for c in adds]
         sub_maps = [extract_value_map(c) for c in subs]
 
-        # Collect all dates
-        all_dates = sorted(set(mv.keys()) | set().union(*[m.keys() for m in add_maps]) | set().union(*[m.keys() for m in sub_maps]))
-
         # Room/Object resolution
         room_name, object_name = resolve_room_and_object(vctr, room_map)
         # fallback if room not found
@@ -389,43 +560,42 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
         if not object_name and room_name:
             object_name = room_name.split('.', 1)[0]
 
-        master_dates = sorted(mv.keys())
-
-        def last_master_value(date_str):
-            candidates = [mv[x] for x in master_dates if x <= date_str]
-            return candidates[-1] if candidates else None
-
-        for d in all_dates:
-            base_val = last_master_value(d)
-            if base_val is None:
-                continue
-
-            add_val = sum(am.get(d, 0) for am in add_maps)
-            sub_val = sum(sm.get(d, 0) for sm in sub_maps)
-            virt_val = base_val + add_val - sub_val
-
-            # Build row
-            row = {
-                "Object": object_name,
-                "Room": room_name,
-                "CounterName": vctr.get("counterName"),
-                "Bild": "",
-                "CounterType": "VIRTUAL",
-                "CounterUnit": unit,
-                "CounterId": "",
-                "RoomId": vctr.get("roomId"),
-                "Date_Orig": datetime.strptime(d, "%Y-%m-%d").strftime("%d.%m.%Y"),
-                "Date_Year": d[:4],
-                "Date_YearMonth": d[:7],
-                "Date_Full": d,
-                "Value_Orig": virt_val,
-                "Value_Num": virt_val,
-                "Remark": "virtual counter",
-                "Created": datetime.now().isoformat(),
-            }
-            rows.append(row)
-
-    df = pd.DataFrame(rows)
+        # Align master (carried forward as-of each date) and components on the union of dates
+        master_ser = pd.Series(mv, dtype=float).sort_index()
+        add_ser = sum_value_maps(add_maps)
+        sub_ser = sum_value_maps(sub_maps)
+        all_dates = master_ser.index.union(add_ser.index).union(sub_ser.index)
+        base = master_ser.reindex(all_dates).ffill()
+        virt = base.add(add_ser, fill_value=0).sub(sub_ser, fill_value=0)[base.notna()]
+        if virt.empty:
+            continue
+
+        d = virt.index.astype(str)
+        virtual_frames.append(pd.DataFrame({
+            "Object": object_name,
+            "Room": room_name,
+            "CounterName": vctr.get("counterName"),
+            "Bild": "",
+            "CounterType": "VIRTUAL",
+            "CounterUnit": unit,
+            "CounterId": counter_id(vctr),
+            "RoomId": vctr.get("roomId"),
+            "Date_Orig": d.str[8:10] + "." + d.str[5:7] + "." + d.str[:4],
+            "Date_Year": d.str[:4],
+            "Date_YearMonth": d.str[:7],
+            "Date_Full": d,
+            "Value_Orig": virt.to_numpy(),
+            "Value_Num": virt.to_numpy(),
+            "Remark": "virtual counter",
+            "Created": datetime.now().isoformat(),
+        }))
+
+    df = compact_dtypes(pd.concat([df_entries, *virtual_frames], ignore_index=True))
+    # The JSON counters/entries and per-column buffers are fully copied into df: free them
+    # before the delta pass and the workbook export, the memory-heavy part of a folder
+    del counters, entry_lists, flat, dates, value_nums, df_entries, virtual_frames, date_full_col, value_col
+    del counter_fields, per_entry, bild_abs, qbm_rows
+    del counter_by_uuid, virtual_counters
     # Remove all JSON_* columns if present
     json_cols = [
         "JSON_RawValue", "JSON_Value", "JSON_Delta", "JSON_RawDelta",
@@ -437,19 +607,18 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
         df = df.sort_values(["Room", "CounterName", "Date_Full"], ascending=[True, True, True])
     # --- Add delta/prev/days for raw data ---
     from ehw_transform import add_delta_columns
-    df = add_delta_columns(df)
+    df = add_delta_columns(df, virtual_to_physical)
     df["_SourceFolder"] = sync_dir.name
-    ALL_ROWS.append(df.copy())
+    combined_rows = df  # not mutated below: reindex() returns a new frame
     print("  --- Zählerübersicht ---")
-    grouped = {}
-    for idx, r in df.iterrows():
-        key = (r["Room"], r["CounterName"])
-        grouped.setdefault(key, {"count":0, "last":None})
-        grouped[key]["count"] += 1
-        grouped[key]["last"] = r["Date_Full"]
-    for (room, cname), info in sorted(grouped.items(), key=lambda x: (str(x[0][0]), str(x[0][1]))):
-        last = str(info["last"]).split(" ")[0] if info["last"] else "-"
-        print(f"    {room}  T:{cname}  #{info['count']}  last:{last}")
+    overview = (
+        df.groupby(["Room", "CounterName"], dropna=False, observed=True)["Date_Full"]
+        .agg(count="size", last="max")
+        .reset_index()
+    )
+    for r in sorted(overview.itertuples(index=False), key=lambda r: (str(r.Room), str(r.CounterName))):
+        last = str(r.last).split(" ")[0] if pd.notna(r.last) else "-"
+        print(f"    {r.Room}  T:{r.CounterName}  #{r.count}  last:{last}")
     # Ensure column order and keep helper path for now
     desired_order = [
         "Object", "Room", "CounterName", "Bild",
@@ -462,151 +631,126 @@ def process_folder(sync_dir: Path, target_base_dir: Path):
     ]
     df = df.reindex(columns=[c for c in desired_order if c in df.columns])
 
-    # Optional prune of stale images in visible tree
-    if PRUNE and visible_images_root.exists():
-        keep = {p.resolve() for p in expected_files}
-        removed = 0
-        for dirpath, _dirs, files in _os.walk(visible_images_root):
-            dpath = Path(dirpath)
-            for fn in files:
-                p = (dpath / fn).resolve()
-                if p not in keep:
-                    if DEBUG:
-                        print(f"[PRUNE] remove stale: {p}")
-                    try:
-                        p.unlink()
-                        removed += 1
-                    except Exception as e:
-                        print(f"[WARN] prune failed for {p}: {e}")
-        if DEBUG:
-            print(f"[PRUNE] removed {removed} files")
+    if not PER_FOLDER:
+        return combined_rows, virtual_to_physical, expected_files
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     excel_name = f"##{sync_dir.name}-{timestamp}.xlsx"
     excel_path = target_base_dir / excel_name
 
-    export_with_format(df, excel_path, script_name="ehw_export")
+    export_with_format(df, excel_path, script_name="ehw_export", vmap=virtual_to_physical)
     cleanup_old_excels(target_base_dir, f"##{sync_dir.name}-")
 
-    # Also create/overwrite a stable latest file for cross-links
+    # Also create/overwrite a stable latest file for cross-links: hardlink to the fresh
+    # workbook (no second write), swapped in atomically; copy if linking is not possible
     latest_path = target_base_dir / f"{sync_dir.name}.xlsx"
+    tmp_path = latest_path.with_name(f".{latest_path.name}.tmp")
     try:
-        shutil.copy2(excel_path, latest_path)
+        try:
+            tmp_path.unlink(missing_ok=True)
+            os.link(excel_path, tmp_path)
+        except OSError:
+            shutil.copy2(excel_path, tmp_path)
+        os.replace(tmp_path, latest_path)
         print(f"[OK] latest XLS updated: {latest_path.name}")
     except Exception as e:
         print(f"[WARN] Konnte Latest Excel nicht schreiben: {latest_path} -> {e}")
 
+    return combined_rows, virtual_to_physical, expected_files
+
 # --- Excel-Formatierung ---
-def export_with_format(df, file_path, script_name):
-    with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, startrow=2, sheet_name="Zählerdaten")
-        # --- Build yearly and monthly aggregated counter sheets ---
-        try:
-            df_year = build_yearly_view(df)
-            df_year.to_excel(writer, index=False, sheet_name="Zählerdaten_Jahr")
-        except Exception as e:
-            print(f"[WARN] Jahres-Ansicht konnte nicht erzeugt werden: {e}")
+# Shared style objects for the write-only workbook (openpyxl needs shared references)
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(*(Side(style="thin"),) * 4)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+def _header_cells(ws, headers):
+    cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        cells.append(cell)
+    return cells
+
+def _excel_rows(df):
+    """Yield plain row tuples; NaN/NaT/None become empty cells."""
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+def _add_table(ws, table_name, headers, first_row, last_row, table_style):
+    ref = f"A{first_row}:{get_column_letter(len(headers))}{last_row}"
+    tbl = Table(displayName=table_name, ref=ref)
+    # write-only sheets cannot be read back, so name the columns explicitly
+    tbl.tableColumns = [TableColumn(id=i, name=str(h)) for i, h in enumerate(headers, start=1)]
+    tbl.tableStyleInfo = TableStyleInfo(
+        name=table_style,
+        showFirstColumn=False,
+        showLastColumn=False,
+        showRowStripes=True,
+        showColumnStripes=False
+    )
+    with warnings.catch_warnings():
+        # openpyxl warns unconditionally for write-only sheets; the columns are set above
+        warnings.simplefilter("ignore", UserWarning)
+        ws.add_table(tbl)
 
-        try:
-            df_month = build_monthly_view(df)
-            df_month.to_excel(writer, index=False, sheet_name="Zählerdaten_Monat")
-        except Exception as e:
-            print(f"[WARN] Monats-Ansicht konnte nicht erzeugt werden: {e}")
-
-
-        # After write: turn Bild text into hyperlinks using __BildAbs
-        ws = writer.book.active
-        # Find column indices
-        headers = [cell.value for cell in ws[3]]
-        def col_index(name):
-            return headers.index(name) + 1 if name in headers else None
-        col_bild = col_index("Bild")
-        col_abs = col_index("__BildAbs")
-        if col_bild and col_abs:
-            for r in range(4, ws.max_row + 1):
-                text = ws.cell(row=r, column=col_bild).value
-                path = ws.cell(row=r, column=col_abs).value
-                if text and path:
-                    # Use absolute file URI to avoid locale/comma/semicolon formula issues
-                    uri = f"file://{path}"
-                    ws.cell(row=r, column=col_bild).value = text
-                    ws.cell(row=r, column=col_bild).hyperlink = uri
-        # Drop helper column if present by clearing its header
-        if col_abs:
-            ws.delete_cols(col_abs, 1)
-
-    wb = load_workbook(file_path)
-    ws = wb.active
-    # --- Re-add header info in row 1 ---
+def _write_view_sheet(wb, sheet_name, df_view, table_name, table_style):
+    ws = wb.create_sheet(sheet_name)
+    headers = list(df_view.columns)
+    ws.append(_header_cells(ws, headers))
+    for row in _excel_rows(df_view):
+        ws.append(row)
+    if len(df_view) >= 1 and headers:
+        _add_table(ws, table_name, headers, 1, len(df_view) + 1, table_style)
+
+def export_with_format(df, file_path, script_name, vmap=None):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Zählerdaten")
+    # --- Header info in row 1, table header in row 3 ---
     try:
         header_info = f"{script_name} -- {file_path.parent} -- {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -- {pwd.getpwuid(os.getuid()).pw_name} -- {os.uname().nodename}"
-        ws["A1"] = header_info
     except Exception as e:
+        header_info = None
         print(f"[WARN] Header row could not be written: {e}")
-    # --- Minimal Excel Table Only ---
-    from openpyxl.worksheet.table import Table, TableStyleInfo
-
-    # Determine table range using non-empty header columns
-    header_cells = ws[3]
-    actual_cols = 0
-    for idx, cell in enumerate(header_cells, start=1):
-        if cell.value not in (None, "", "__BildAbs"):
-            actual_cols = idx
-
-    if actual_cols > 0 and ws.max_row >= 3:
-        last_row = ws.max_row
-        last_col_letter = ws.cell(row=3, column=actual_cols).column_letter
-        # Force full range so virtual rows always included
-        table_range = f"A3:{last_col_letter}{last_row}"
-
-        # Always use fixed table name "tblEHW" for Zählerdaten
-        tbl = Table(displayName="tblEHW", ref=table_range)
-        style = TableStyleInfo(
-            name="TableStyleMedium9",
-            showFirstColumn=False,
-            showLastColumn=False,
-            showRowStripes=True,
-            showColumnStripes=False
-        )
-        tbl.tableStyleInfo = style
-        ws.add_table(tbl)
-
-    # --- Add tables for yearly and monthly sheets ---
-    from openpyxl.utils import get_column_letter
+    ws.append([header_info])
+    ws.append([])
 
-    def add_table_to_sheet(sheet_name, table_style):
-        if sheet_name not in wb.sheetnames:
-            return
-        wsx = wb[sheet_name]
-        if wsx.max_row < 2 or wsx.max_column < 1:
-            return
+    headers = [c for c in df.columns if c != "__BildAbs"]
+    ws.append(_header_cells(ws, headers))
 
-        # Determine last column/row
-        last_col_letter = get_column_letter(wsx.max_column)
-        last_row = wsx.max_row
-        table_range = f"A1:{last_col_letter}{last_row}"
-
-        # Assign fixed table names
-        if sheet_name == "Zählerdaten_Jahr":
-            table_name = "tblehwJahr"
-        elif sheet_name == "Zählerdaten_Monat":
-            table_name = "tblehwMonat"
-        elif sheet_name == "Zählerdaten":
-            table_name = "tblEHW"
-        else:
-            table_name = "TblData"
+    # Bild text becomes a hyperlink to __BildAbs while writing (helper column is not written)
+    col_bild = headers.index("Bild") if "Bild" in headers and "__BildAbs" in df.columns else None
+    if col_bild is not None:
+        abs_paths = df["__BildAbs"].astype(object).where(df["__BildAbs"].notna(), None)
+    else:
+        abs_paths = [None] * len(df)
+    for row, path in zip(_excel_rows(df[headers]), abs_paths):
+        text = row[col_bild] if col_bild is not None else None
+        if text and path:
+            # Use absolute file URI to avoid locale/comma/semicolon formula issues
+            cell = WriteOnlyCell(ws, value=text)
+            cell.hyperlink = f"file://{path}"
+            row = row[:col_bild] + (cell,) + row[col_bild + 1:]
+        ws.append(row)
+
+    if headers:
+        # Always use fixed table name "tblEHW" for Zählerdaten
+        _add_table(ws, "tblEHW", headers, 3, len(df) + 3, "TableStyleMedium9")
 
-        t = Table(displayName=table_name, ref=table_range)
-        t.tableStyleInfo = TableStyleInfo(
-            name=table_style,
-            showRowStripes=True,
-            showColumnStripes=False
-        )
-        wsx.add_table(t)
+    # --- Build yearly and monthly aggregated counter sheets ---
+    try:
+        df_year = build_yearly_view(df, vmap)
+        _write_view_sheet(wb, "Zählerdaten_Jahr", df_year, "tblehwJahr", "TableStyleMedium4")
+    except Exception as e:
+        print(f"[WARN] Jahres-Ansicht konnte nicht erzeugt werden: {e}")
 
-    # Different colors for the tables
-    add_table_to_sheet("Zählerdaten_Jahr", "TableStyleMedium4")
-    add_table_to_sheet("Zählerdaten_Monat", "TableStyleMedium7")
+    try:
+        df_month = build_monthly_view(df, vmap)
+        _write_view_sheet(wb, "Zählerdaten_Monat", df_month, "tblehwMonat", "TableStyleMedium7")
+    except Exception as e:
+        print(f"[WARN] Monats-Ansicht konnte nicht erzeugt werden: {e}")
 
     wb.save(file_path)
     print(f"[OK] XLS saved: {file_path.name}")
@@ -638,7 +782,7 @@ def get_version():
         if version.startswith("v"):
             version = version[1:]
         return version
-    except:
+    except Exception:
         return "unknown"
 
 def main():
@@ -657,22 +801,47 @@ def main():
         ["python3", "ehw_fix_Images.py", "-c", CONFIG_FILE, "--apply"],
         check=True
     )
+    sync_dirs = []
     for folder_name in config["folders"]:
         sync_dir = base_sync_dir / folder_name
         if sync_dir.exists():
-            process_folder(sync_dir, target_base_dir)
+            sync_dirs.append(sync_dir)
         else:
             print(f"[WARN] Ordner fehlt: {sync_dir}")
 
-    if ALL_ROWS:
-        combined = pd.concat(ALL_ROWS, ignore_index=True)
+    # Folders are independent (own JSON, images and workbook): process them in parallel.
+    # spawn: fresh interpreters instead of forking a parent that may already hold threads.
+    # ex.map keeps config order, so the combined workbook is deterministic.
+    if len(sync_dirs) > 1:
+        workers = min(len(sync_dirs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            results = list(ex.map(process_folder, sync_dirs, [target_base_dir] * len(sync_dirs)))
+    else:
+        results = [process_folder(sync_dir, target_base_dir) for sync_dir in sync_dirs]
+    all_rows = []
+    vmap = {}
+    expected_files = []
+    for result in results:
+        if result is not None:
+            all_rows.append(result[0])
+            vmap.update(result[1])
+            expected_files.extend(result[2])
+
+    # All folders share the visible root, so prune only once every worker has written
+    # its images, against the union of what they expect
+    if PRUNE:
+        prune_stale_files(target_base_dir, expected_files)
+
+    if all_rows:
+        # per-folder categories differ, so concat falls back to object: re-compact
+        combined = compact_dtypes(pd.concat(all_rows, ignore_index=True))
 
         # Remove _SourceFolder entirely
         if "_SourceFolder" in combined.columns:
             combined = combined.drop(columns=["_SourceFolder"])
 
         combined_path = target_base_dir / "ehw+.xlsx"
-        export_with_format(combined, combined_path, script_name="ehw_export_combined")
+        export_with_format(combined, combined_path, script_name="ehw_export_combined", vmap=vmap)
         print(f"[OK] combined XLS saved: {combined_path.name}")
 if __name__ == "__main__":
     main()
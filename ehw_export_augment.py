@@ -11,13 +11,16 @@ import re
 # --------------------------------------------------------------------------------------
 
 _FORBIDDEN = r'<>:"/\\|?*\x00-\x1F'
+_FORBIDDEN_RE = re.compile(f"[{_FORBIDDEN}]")
+_WS_RE = re.compile(r"\s+")
+_SHEET_RE = re.compile(r"[][:*?/\\]")
 
 def safe_filename(name: str) -> str:
     """Sanitize to a safe filename (Windows/macOS friendly)."""
     if name is None:
         return "unnamed"
-    name = re.sub(f"[{_FORBIDDEN}]", "_", str(name))
-    name = re.sub(r"\s+", " ", name).strip()
+    name = _FORBIDDEN_RE.sub("_", str(name))
+    name = _WS_RE.sub(" ", name).strip()
     name = name.rstrip(" .")
     return name or "unnamed"
 
@@ -25,7 +28,7 @@ def safe_sheet_name(name: str) -> str:
     """Excel sheet name: max 31 chars, no []:*?/\\ and cannot end with '"""
     if name is None:
         name = "Sheet"
-    name = re.sub(r"[][:*?/\\]", "_", str(name))
+    name = _SHEET_RE.sub("_", str(name))
     name = name.strip("'")
     return name[:31] if len(name) > 31 else name
 
@@ -34,7 +37,9 @@ def safe_sheet_name(name: str) -> str:
 # --------------------------------------------------------------------------------------
 
 def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    # Shallow copy: columns below are replaced, never written into, so the caller's
+    # frame stays untouched without duplicating its data.
+    df = df.copy(deep=False)
     lower = {c.lower(): c for c in df.columns}
     ren = {}
     for want in ["meter_id", "meter_name", "date", "reading"]:
@@ -53,14 +58,17 @@ def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
         df["date"] = pd.to_datetime(df["date"], errors="coerce", utc=False)
 
     df["reading"] = pd.to_numeric(df["reading"], errors="coerce")
-    df.sort_values(["meter_id", "date"], inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    return df
+    return df.sort_values(["meter_id", "date"], ignore_index=True)
 
 def _compute_periods(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df["prev_date"] = df.groupby("meter_id")["date"].shift(1)
-    df["prev_reading"] = df.groupby("meter_id")["reading"].shift(1)
+    df = df.copy(deep=False)  # only adds columns
+    # Rows are sorted by (meter_id, date) (see _ensure_cols), so a plain shift with the
+    # first row of each meter masked out equals the per-meter groupby shift.
+    mid = df["meter_id"].to_numpy()
+    first = np.ones(len(df), dtype=bool)
+    first[1:] = mid[1:] != mid[:-1]
+    df["prev_date"] = df["date"].shift(1).mask(first)
+    df["prev_reading"] = df["reading"].shift(1).mask(first)
     df["days"] = (df["date"] - df["prev_date"]).dt.days
     df["consumption"] = df["reading"] - df["prev_reading"]
     df["daily_rate"] = np.where(df["days"] > 0, df["consumption"] / df["days"], np.nan)
@@ -68,82 +76,109 @@ def _compute_periods(df: pd.DataFrame) -> pd.DataFrame:
     df["Quelle"] = "gemessen"
     return df
 
-def _interp_reading_for_date(sub: pd.DataFrame, target_date: pd.Timestamp) -> Tuple[float, float]:
-    sub = sub.sort_values("date")
-    match = sub.loc[sub["date"] == target_date]
-    if not match.empty:
-        row = match.iloc[0]
-        return float(row["reading"]), float(row["daily_rate"] if pd.notna(row["daily_rate"]) else 0.0)
-
-    before = sub[sub["date"] <= target_date].tail(1)
-    after = sub[sub["date"] >= target_date].head(1)
-
-    if not before.empty and not after.empty and before.iloc[0]["date"] != after.iloc[0]["date"]:
-        d0 = before.iloc[0]["date"]
-        r0 = before.iloc[0]["reading"]
-        d1 = after.iloc[0]["date"]
-        r1 = after.iloc[0]["reading"]
-        total_days = (d1 - d0).days
-        if total_days > 0:
-            frac = (target_date - d0).days / total_days
-            reading_est = r0 + frac * (r1 - r0)
-            period = after.iloc[0]
-            daily_rate = float(period["daily_rate"]) if pd.notna(period["daily_rate"]) else float((r1 - r0) / total_days)
-            return float(reading_est), daily_rate
-
-    if not before.empty:
-        row = before.iloc[0]
-        rate = float(row["daily_rate"]) if pd.notna(row["daily_rate"]) else 0.0
-        delta_days = (target_date - row["date"]).days
-        return float(row["reading"] + rate * delta_days), rate
-
-    if not after.empty:
-        row = after.iloc[0]
-        rate = float(row["daily_rate"]) if pd.notna(row["daily_rate"]) else 0.0
-        delta_days = (row["date"] - target_date).days
-        return float(row["reading"] - rate * delta_days), rate
-
-    return (np.nan, np.nan)
+def _interp_readings(dates: np.ndarray, readings: np.ndarray, rates: np.ndarray,
+                     targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimated reading and daily rate of one meter at each target date.
+
+    dates must be sorted without NaT. A reading on the target date is taken as is;
+    otherwise it is interpolated between the surrounding readings, or extrapolated
+    from the nearest one with its daily rate (rates default to 0.0 when missing).
+    """
+    n = len(dates)
+    if n == 0:
+        nan = np.full(len(targets), np.nan)
+        return nan, nan.copy()
+    one_day = np.timedelta64(1, "D")
+    lo = np.searchsorted(dates, targets, side="left")    # first reading >= target
+    hi = np.searchsorted(dates, targets, side="right") - 1  # last reading <= target
+    has_after = lo < n
+    has_before = hi >= 0
+    lo_c = np.minimum(lo, n - 1)
+    hi_c = np.maximum(hi, 0)
+    d0, r0, q0 = dates[hi_c], readings[hi_c], rates[hi_c]
+    d1, r1, q1 = dates[lo_c], readings[lo_c], rates[lo_c]
+
+    match = has_after & (d1 == targets)
+    total_days = (d1 - d0) // one_day
+    interp = ~match & has_before & has_after & (total_days > 0)
+    before_only = ~match & ~interp & has_before
+    after_only = ~match & ~interp & ~has_before & has_after
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = ((targets - d0) // one_day) / total_days
+        interp_reading = r0 + frac * (r1 - r0)
+        interp_rate = np.where(np.isnan(q1), (r1 - r0) / total_days, q1)
+    q0_or_0 = np.where(np.isnan(q0), 0.0, q0)
+    q1_or_0 = np.where(np.isnan(q1), 0.0, q1)
+
+    reading = np.select(
+        [match, interp, before_only, after_only],
+        [r1,
+         interp_reading,
+         r0 + q0_or_0 * ((targets - d0) // one_day),
+         r1 - q1_or_0 * ((d1 - targets) // one_day)],
+        default=np.nan,
+    )
+    rate = np.select(
+        [match, interp, before_only, after_only],
+        [q1_or_0, interp_rate, q0_or_0, q1_or_0],
+        default=np.nan,
+    )
+    return reading, rate
 
 def _normalized_rows(df: pd.DataFrame) -> pd.DataFrame:
-    rows = []
     if df["date"].notna().any():
         year_min = int(df["date"].min().year)
         year_max = int(df["date"].max().year)
     else:
         return pd.DataFrame(columns=df.columns)
 
+    # Jan 1 and Dec 31 of every year, in that order
+    targets = pd.DatetimeIndex([
+        pd.Timestamp(year=y, month=m, day=d)
+        for y in range(year_min, year_max + 1)
+        for m, d in ((1, 1), (12, 31))
+    ])
+
+    frames = []
     for meter_id, sub in df.groupby("meter_id"):
         meter_name = sub["meter_name"].iloc[0] if "meter_name" in sub.columns else meter_id
         unit = sub["unit"].iloc[0] if "unit" in sub.columns else None
 
-        for y in range(year_min, year_max + 1):
-            jan1 = pd.Timestamp(year=y, month=1, day=1)
-            dec31 = pd.Timestamp(year=y, month=12, day=31)
-
-            for target in (jan1, dec31):
-                reading_est, rate_est = _interp_reading_for_date(sub, target)
-                if pd.isna(reading_est):
-                    continue
-                rows.append({
-                    "meter_id": meter_id,
-                    "meter_name": meter_name,
-                    "date": target,
-                    "reading": reading_est,
-                    "prev_date": pd.NaT,
-                    "prev_reading": np.nan,
-                    "days": np.nan,
-                    "consumption": np.nan,
-                    "daily_rate": rate_est if pd.notna(rate_est) else np.nan,
-                    "annualized_consumption": (rate_est * 365.0) if pd.notna(rate_est) else np.nan,
-                    "Quelle": "ermittelt",
-                    **({"unit": unit} if unit is not None else {}),
-                })
-
-    if not rows:
+        valid = sub["date"].notna().to_numpy()
+        dates = sub["date"].to_numpy()[valid]
+        meter_targets = targets.to_numpy().astype(dates.dtype)
+        reading, rate = _interp_readings(
+            dates,
+            sub["reading"].to_numpy(dtype="float64")[valid],
+            sub["daily_rate"].to_numpy(dtype="float64")[valid],
+            meter_targets,
+        )
+        keep = ~np.isnan(reading)
+        if not keep.any():
+            continue
+        part = pd.DataFrame({
+            "meter_id": meter_id,
+            "meter_name": meter_name,
+            "date": targets[keep],
+            "reading": reading[keep],
+            "prev_date": pd.NaT,
+            "prev_reading": np.nan,
+            "days": np.nan,
+            "consumption": np.nan,
+            "daily_rate": rate[keep],
+            "annualized_consumption": rate[keep] * 365.0,
+            "Quelle": "ermittelt",
+        })
+        if unit is not None:
+            part["unit"] = unit
+        frames.append(part)
+
+    if not frames:
         return pd.DataFrame(columns=df.columns)
-    norm = pd.DataFrame(rows)
+    norm = pd.concat(frames, ignore_index=True, sort=False)
     norm["date"] = pd.to_datetime(norm["date"])
+    norm["prev_date"] = norm["prev_date"].astype(df["date"].dtype)
     return norm
 
 def build_consumption_sheet(df_readings: pd.DataFrame) -> pd.DataFrame:
@@ -151,7 +186,7 @@ def build_consumption_sheet(df_readings: pd.DataFrame) -> pd.DataFrame:
     with_periods = _compute_periods(base)
     normalized = _normalized_rows(with_periods)
     out = pd.concat([with_periods, normalized], ignore_index=True, sort=False)
-    out.sort_values(["meter_id", "date", "Quelle"], inplace=True)
+    out = out.sort_values(["meter_id", "date", "Quelle"])
 
     cols = ["meter_id", "meter_name", "date", "reading", "days", "consumption",
             "daily_rate", "annualized_consumption", "Quelle"]
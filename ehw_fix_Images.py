@@ -13,35 +13,72 @@ Konfig: ehw_export.conf.json mit keys: source_base_dir, target_base_dir, folders
 Erwartet: <Folder>/<Folder>.json (z.B. H1/H1.json) nur noch optional (UUID-zu-Name ist für diesen Schritt nicht nötig).
 """
 import argparse
-import hashlib
+import errno
 import json
 import os
 import re
 from pathlib import Path
-from shutil import copy2, move
+from shutil import copyfile, move
 from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-SLASH_CONFLICT_RE = re.compile(r"\s*\(slash conflict\)$")
+try:
+    import orjson  # schnelleres JSON-Parsing (pip install orjson)
+except ImportError:
+    orjson = None
+
+TRANSFER_WORKERS = 8  # parallele Kopier-/Verschiebe-Threads pro Ordner
+SLASH_CONFLICT = "(slash conflict)"  # Namensendung, davor optional Leerraum
 NUMBERED_COPY_RE = re.compile(r"\s\((\d+)\)$")
+SAFE_NAME_TABLE = str.maketrans({c: "_" for c in '\\/|:*?"<>'})
 NAME_KEYS = {"name", "title", "displayName", "label"}
 ID_KEYS = {"id", "uuid", "uid"}
 
-def sha256sum(path: Path, chunk: int = 1024*1024) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
+PARTIAL_WINDOW = 64 * 1024
+
+def head_tail_equal(a: Path, b: Path, size: int, window: int = PARTIAL_WINDOW) -> bool:
+    """Vergleicht nur Anfang und Ende (je window Bytes) zweier gleich großer Dateien."""
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        if fa.read(window) != fb.read(window):
+            return False
+        if size > window:
+            tail = max(size - window, window)
+            fa.seek(tail)
+            fb.seek(tail)
+            return fa.read(window) == fb.read(window)
+    return True
+
+def files_equal(a: Path, b: Path, chunk: int = 1024*1024) -> bool:
+    """Byte-Vergleich in Blöcken (bytes == ist memcmp), bricht beim ersten Unterschied ab.
+    Kein Hash nötig, wenn nur zwei Dateien verglichen werden."""
+    with open(a, "rb") as fa, open(b, "rb") as fb:
         while True:
-            b = f.read(chunk)
-            if not b:
-                break
-            h.update(b)
-    return h.hexdigest()
+            ba = fa.read(chunk)
+            if ba != fb.read(chunk):
+                return False
+            if not ba:
+                return True
+
+def try_stat(p) -> Optional[os.stat_result]:
+    """os.stat() oder None, wenn der Pfad nicht existiert (wie Path.exists())."""
+    try:
+        return os.stat(p)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
 
-def same_file(a: Path, b: Path) -> bool:
+def same_file(a: Path, b: Path, b_stat: Optional[os.stat_result] = None) -> bool:
+    """b_stat: bereits bekanntes stat von b (transfer_file hat es schon), spart den Syscall."""
     try:
-        if a.stat().st_size != b.stat().st_size:
+        size = a.stat().st_size
+        if size != (b_stat or b.stat()).st_size:
+            return False
+        # Unterschiedliche Dateien fallen meist schon an Anfang/Ende auf
+        if not head_tail_equal(a, b, size):
             return False
-        return sha256sum(a) == sha256sum(b)
+        if size <= 2 * PARTIAL_WINDOW:
+            return True  # Anfang + Ende haben bereits die ganze Datei abgedeckt
+        return files_equal(a, b)
     except FileNotFoundError:
         return False
 
@@ -55,8 +92,8 @@ def load_folder_json(src_folder: Path) -> Optional[dict]:
     cand = src_folder / f"{stem}.json"
     if cand.exists():
         try:
-            with open(cand, "r", encoding="utf-8") as f:
-                return json.load(f)
+            raw = cand.read_bytes()
+            return orjson.loads(raw) if orjson is not None else json.loads(raw)
         except Exception:
             return None
     return None
@@ -64,8 +101,11 @@ def load_folder_json(src_folder: Path) -> Optional[dict]:
 def collect_uuid_name_map(data) -> Dict[str, str]:
     """Heuristisch UUID->Name Paare aus verschachtelten Dict/List-Strukturen sammeln."""
     out: Dict[str, str] = {}
-
-    def visit(node):
+    # expliziter Stack statt Rekursion; Kinder umgekehrt auflegen, damit die Reihenfolge
+    # (spätere Treffer überschreiben frühere) der rekursiven Tiefensuche entspricht
+    stack = [data] if data is not None else []
+    while stack:
+        node = stack.pop()
         if isinstance(node, dict):
             id_val = None
             name_val = None
@@ -81,14 +121,9 @@ def collect_uuid_name_map(data) -> Dict[str, str]:
                     break
             if id_val and name_val:
                 out[id_val] = name_val
-            for v in node.values():
-                visit(v)
+            stack.extend(reversed(node.values()))
         elif isinstance(node, list):
-            for v in node:
-                visit(v)
-
-    if data is not None:
-        visit(data)
+            stack.extend(reversed(node))
     return out
 
 def ensure_legacy_dot_folder(base_target: Path, folder_name: str) -> None:
@@ -110,33 +145,111 @@ def parse_dest_parts_from_filename(name_no_suffix: str, ext: str):
     return None, None, base_wo_ext + ext
 
 def safe_name(s: str) -> str:
-    return re.sub(r"[\\/|:*?\"<>]", "_", s).strip()
+    return s.translate(SAFE_NAME_TABLE).strip()
+
+# os.copy_file_range (Linux): der Kernel kopiert selbst, auf btrfs/xfs als Reflink, auf
+# NFS/CIFS serverseitig. Wird abgeschaltet, sobald das Dateisystem es ablehnt.
+_copy_range_ok = hasattr(os, "copy_file_range")
+_COPY_RANGE_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL}
+
+def _copy_range(src: Path, dst: Path) -> bool:
+    """Kopie per copy_file_range; False, wenn nicht (vollständig) möglich."""
+    global _copy_range_ok
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if n == 0:
+                    return False
+                remaining -= n
+        except OSError as e:
+            if e.errno not in _COPY_RANGE_UNSUPPORTED:
+                raise
+            _copy_range_ok = False
+            return False
+    return True
+
+def copy_file(src: Path, dst: Path) -> None:
+    """Kopiert Inhalt und Zeitstempel (statt copy2: kein chmod/xattr-Roundtrip aufs NAS)."""
+    if not (_copy_range_ok and _copy_range(src, dst)):
+        copyfile(src, dst)
+    st = os.stat(src)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def transfer_file(src: Path, dst: Path, mode: str, apply: bool) -> str:
+    """Legt src unter dst ab (copy/move/symlink); Ergebnis: "moved", "skipped" oder "error"."""
+    try:
+        dst_stat = try_stat(dst)  # ein stat für exists() und Größenvergleich
+        if dst_stat is not None:
+            if same_file(src, dst, dst_stat):
+                return "skipped"
+            if apply:
+                copy_file(src, dst)
+            return "moved"
+
+        if apply:
+            if mode == "copy":
+                copy_file(src, dst)
+            elif mode == "move":
+                try:
+                    move(str(src), str(dst))
+                except Exception:
+                    copy_file(src, dst)
+                    try:
+                        src.unlink()
+                    except Exception:
+                        pass
+            elif mode == "symlink":
+                rel_target = os.path.relpath(src, start=dst.parent)
+                os.symlink(rel_target, dst)
+            else:
+                raise ValueError(f"Unknown mode: {mode}")
+
+        return "moved"
+    except Exception as e:
+        print(f"! ERROR {src} -> {dst}: {e}")
+        return "error"
 
 def process_folder(src_folder: Path, dst_base: Path, mode: str, apply: bool, verbose: bool):
     # 1) alte Struktur (falls vorhanden) -> .<folder>
 
-    # 2) UUID->Name Map laden
-    js = load_folder_json(src_folder)
-    uuid2name = collect_uuid_name_map(js) if js else {}
-
-    # 3) Neue Struktur: Basis nur base, ohne versteckten Ordner-Layer
+    # 2) Neue Struktur: Basis nur base, ohne versteckten Ordner-Layer
     canonical_root = dst_base
     canonical_root.mkdir(parents=True, exist_ok=True)
 
-    entries = sorted(p for p in src_folder.iterdir() if p.is_file())
+    # scandir: is_file() kommt aus d_type (kein stat), sortiert wird nach dem Namen (str)
+    with os.scandir(src_folder) as it:
+        listing = list(it)
+    # alle Namen im Ordner: Existenz-Checks für Geschwister-Dateien ohne stat (wichtig auf SMB/NFS)
+    names = {e.name for e in listing}
+    entries = sorted((e for e in listing if e.is_file()), key=lambda e: e.name)
+
+    # Nichts zu reparieren (der Normalfall): JSON nicht laden und nicht durchlaufen
+    if not any(e.name.endswith(SLASH_CONFLICT) for e in entries):
+        if verbose:
+            print(f"bilder {src_folder.name}: {len(entries)} bilder gesamt, 0 neu kopiert")
+        return 0, len(entries), 0
+
+    # 3) UUID->Name Map laden
+    js = load_folder_json(src_folder)
+    uuid2name = collect_uuid_name_map(js) if js else {}
     moved = skipped = errors = 0
     total = 0
     last_date = None
+    ensured_dirs = set()
+    work: Dict[Path, list] = {}  # dst -> [src, ...]
 
-    for src in entries:
+    for entry in entries:
         total += 1
         last_date = datetime.now().strftime("%Y-%m-%d")
-        name = src.name
-        if not SLASH_CONFLICT_RE.search(name):
+        name = entry.name
+        if not name.endswith(SLASH_CONFLICT):
             skipped += 1
             continue
+        src = Path(entry.path)
 
-        stripped = SLASH_CONFLICT_RE.sub("", name)
+        stripped = name[:-len(SLASH_CONFLICT)].rstrip()
 
         # Extension ermitteln (auch Mehrfach-Suffixe)
         ext = "".join(Path(stripped).suffixes)
@@ -150,7 +263,7 @@ def process_folder(src_folder: Path, dst_base: Path, mode: str, apply: bool, ver
         if mnum:
             # Kandidat für die Originaldatei MIT dem ursprünglichen '(slash conflict)'-Suffix
             original_with_suffix = f"{base_wo_ext[:mnum.start()]}{ext} (slash conflict)"
-            if (src_folder / original_with_suffix).exists():
+            if original_with_suffix in names:
                 skipped += 1
                 continue
 
@@ -162,42 +275,26 @@ def process_folder(src_folder: Path, dst_base: Path, mode: str, apply: bool, ver
             room_uuid = "unknown-room"
         counter_uuid = remainder.split("_")[0] if "_" in remainder else "unknown-counter"
         dst_dir = canonical_root / f".{obj_uuid}" / room_uuid / counter_uuid
-        dst_dir.mkdir(parents=True, exist_ok=True)
-        dst = dst_dir / remainder
+        if dst_dir not in ensured_dirs:
+            dst_dir.mkdir(parents=True, exist_ok=True)
+            ensured_dirs.add(dst_dir)
+        # mehrere Quellen mit gleichem Ziel bleiben in Reihenfolge in einem Auftrag
+        work.setdefault(dst_dir / remainder, []).append(src)
 
-        try:
-            if dst.exists():
-                if same_file(src, dst):
-                    skipped += 1
-                    continue
-                else:
-                    if apply:
-                        copy2(src, dst)
-                    moved += 1
-                    continue
+    # 4) Kopieren/Verschieben parallel: reine Datei-I/O, die Threads warten überlappend
+    def run(item):
+        dst, srcs = item
+        return [transfer_file(src, dst, mode, apply) for src in srcs]
 
-            if apply:
-                if mode == "copy":
-                    copy2(src, dst)
-                elif mode == "move":
-                    try:
-                        move(str(src), str(dst))
-                    except Exception:
-                        copy2(src, dst)
-                        try:
-                            src.unlink()
-                        except Exception:
-                            pass
-                elif mode == "symlink":
-                    rel_target = os.path.relpath(src, start=dst.parent)
-                    os.symlink(rel_target, dst)
+    with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as ex:
+        for results in ex.map(run, work.items()):
+            for result in results:
+                if result == "moved":
+                    moved += 1
+                elif result == "skipped":
+                    skipped += 1
                 else:
-                    raise ValueError(f"Unknown mode: {mode}")
-
-            moved += 1
-        except Exception as e:
-            errors += 1
-            print(f"! ERROR {src} -> {dst}: {e}")
+                    errors += 1
 
     if verbose:
         print(f"bilder {src_folder.name}: {total} bilder gesamt, {moved} neu kopiert, last {last_date}")
@@ -21,148 +21,169 @@ def build_virtual_mapping(counters_json):
 
     return virtual_to_physical, physical_to_virtual
 
+def counter_id(counter):
+    """
+    CounterId the rows of a counter carry: its counterId (meter serial).
+    Virtual counters usually have none and fall back to their uuid.
+    """
+    cid = counter.get("counterId")
+    if not cid and counter.get("counterType") == "VIRTUAL":
+        cid = counter.get("uuid")
+    return cid
+
+def build_virtual_mapping_by_id(counters_json):
+    """
+    virtual_to_physical of build_virtual_mapping with the uuids translated to
+    counter_id(), the key the transforms sort and group by:
+      {virtual_counter_id: [phys_counter_id1, phys_counter_id2, ...]}
+    Counters without an id (or unknown uuids) are left out.
+    """
+    ids = {c.get("uuid"): counter_id(c) for c in counters_json}
+    virtual_to_physical, _ = build_virtual_mapping(counters_json)
+
+    by_id = {}
+    for vuuid, children in virtual_to_physical.items():
+        vid = ids.get(vuuid)
+        if vid:
+            by_id[vid] = [ids[c] for c in children if ids.get(c)]
+    return by_id
+
+import numpy as np
 import pandas as pd
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter
-import re as _re
 
-# Helper function for virtual reset detection
-def detect_virtual_reset(counter_id, previous_val, current_val, vmap):
+# Low-cardinality text columns used as group/sort keys and in comparisons
+COUNTER_COLS = ["Object", "Room", "CounterName", "CounterType", "CounterUnit", "CounterId"]
+
+# Columns of the raw frame the yearly/monthly views read (besides Date_Full)
+VIEW_SOURCE_COLS = ["Object", "Room", "CounterName", "CounterId", "Value_Num", "CounterType", "CounterUnit"]
+
+# One CreatedAt for every sheet built in this run
+CREATED_AT = pd.Timestamp.now().isoformat()
+
+def created_at_column(n):
+    """CreatedAt for n rows as a single-category column (int8 codes, not n strings)."""
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[CREATED_AT])
+
+def full_dates(df):
+    """Date_Full as datetime64; only parsed if it is not one already (add_delta_columns output is)."""
+    dates = df["Date_Full"]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    return pd.to_datetime(dates, errors="coerce")
+
+def counter_categories(df):
+    """COUNTER_COLS present in df as category (no-op for columns that already are)."""
+    return {c: df[c].astype("category") for c in COUNTER_COLS if c in df.columns}
+
+def prev_delta_columns(df, date_col):
+    """
+    PrevValue, PrevDate, Delta, ResetDetected per CounterId (vectorized).
+    df must be sorted by CounterId and date_col. A value below its predecessor
+    is a reset (virtual counters included): Delta = value, no PrevValue/PrevDate.
+    """
+    # Sorted rows: a plain shift with each group's first row masked out equals the
+    # groupby shift. Codes instead of the ids themselves so NaN ids form one group.
+    codes, _ = pd.factorize(df["CounterId"], sort=False)
+    first = np.ones(len(df), dtype=bool)
+    np.not_equal(codes[1:], codes[:-1], out=first[1:])
+    current = df["Value_Num"]
+    previous = current.shift(1).mask(first)
+    reset = current < previous
+    return {
+        "PrevValue": previous.mask(reset),
+        "PrevDate": df[date_col].shift(1).mask(first | reset),
+        "Delta": current.where(reset, current - previous),
+        "ResetDetected": reset,
+    }
+
+def assign_sortkey(df, vmap):
     """
-    Detect reset for virtual counters:
-    If counter is virtual AND current_val < previous_val → reset.
+    _SortKey per row: "<n>.0.0" for the n-th CounterName in sorted order, the
+    physical children of a virtual counter follow it as "<n>.0.1", "<n>.0.2", ...
+    Rows whose CounterId got no key keep "". vmap is keyed by CounterId
+    (build_virtual_mapping_by_id).
     """
-    if counter_id in vmap:
-        if previous_val is not None and current_val is not None:
-            if current_val < previous_val:
-                return True
-    return False
-
-def build_yearly_view(df):
-    df2 = df.copy()
-    df2["Date"] = pd.to_datetime(df2["Date_Full"], errors="coerce")
-    df2 = df2.sort_values(["CounterId", "Date"])
+    first_cid = df.drop_duplicates("CounterName")
+    first_cid = dict(zip(first_cid["CounterName"], first_cid["CounterId"]))
+
+    cid_to_key = {}
+    parents = []
+    for order_index, cname in enumerate(sorted(df["CounterName"].unique()), start=1):
+        cid = first_cid[cname]
+        if not pd.isna(cid):
+            cid_to_key[cid] = f"{order_index}.0.0"
+        if cid in vmap:
+            parents.append((order_index, cid))
+
+    # virtual → Kinder einsortieren, after all own keys: a child whose name sorts
+    # after its parent must not get its own key back
+    for order_index, cid in parents:
+        for sub_idx, child in enumerate(vmap[cid], start=1):
+            cid_to_key[child] = f"{order_index}.0.{sub_idx}"
+
+    return df["CounterId"].astype(object).map(cid_to_key).fillna("")
+
+def readings_at_cutoffs(df2, cutoffs, by, tolerance):
+    """
+    One reading per cutoffs row (CounterId, Cutoff, ...): the last one at or
+    before Cutoff within the `by` group, else the counter's first one after
+    Cutoff up to `tolerance` later. Rows with neither are dropped.
+    """
+    cols = ["Object", "Room", "CounterName", "Date", "Value_Num", "CounterType", "CounterUnit"]
+    # stable: equal dates keep their order, so ties resolve like iloc[-1]/iloc[0]
+    right = df2.sort_values("Date", kind="stable")
+    left = cutoffs.sort_values("Cutoff", kind="stable")
+
+    picked = pd.merge_asof(
+        left, right[cols + by], left_on="Cutoff", right_on="Date",
+        by=by, direction="backward",
+    )
+    missing = picked["Date"].isna().to_numpy()
+    if missing.any():
+        after = pd.merge_asof(
+            left[missing], right[cols + ["CounterId"]], left_on="Cutoff", right_on="Date",
+            by="CounterId", direction="forward", tolerance=tolerance, allow_exact_matches=False,
+        )
+        picked = pd.concat([picked[~missing], after], ignore_index=True)
+    return picked.dropna(subset=["Date"]).reset_index(drop=True)
+
+def build_yearly_view(df, vmap=None):
+    # only the columns the view reads: dropna/sort below then copy those, not the whole frame
+    df2 = df[VIEW_SOURCE_COLS].assign(Date=full_dates(df), **counter_categories(df))
+    df2 = df2.dropna(subset=["CounterId", "Date"]).sort_values(["CounterId", "Date"])
     df2["Year"] = df2["Date"].dt.year
 
-    yearly = []
-    for cid, group in df2.groupby("CounterId"):
-        for year, g2 in group.groupby("Year"):
-            year_end = pd.Timestamp(year=year, month=12, day=31)
-            g_before = g2[g2["Date"] <= year_end]
-
-            if not g_before.empty:
-                row = g_before.iloc[-1]
-            else:
-                g_after = group[
-                    (group["Date"] > year_end) &
-                    (group["Date"] <= year_end + pd.Timedelta(days=15))
-                ]
-                if g_after.empty:
-                    continue
-                row = g_after.iloc[0]
-
-            yearly.append({
-                "Object": row["Object"],
-                "Room": row["Room"],
-                "CounterName": row["CounterName"],
-                "CounterId": cid,
-                "Year": year,
-                "Date": row["Date"],
-                "Value_Num": row["Value_Num"],
-                "CounterType": row["CounterType"],
-                "CounterUnit": row["CounterUnit"],
-            })
-
-    df_year = pd.DataFrame(yearly).sort_values(["CounterId", "Year"])
+    # Per counter and year: last reading of that year up to Dec 31,
+    # else the first one up to 15 days later
+    cutoffs = df2[["CounterId", "Year"]].drop_duplicates()
+    # Dec 31 = Jan 1 of the next year minus a day (datetime64[Y] counts years from 1970)
+    next_year = (cutoffs["Year"].to_numpy() - 1969).astype("datetime64[Y]")
+    cutoffs["Cutoff"] = (next_year - np.timedelta64(1, "D")).astype(df2["Date"].dtype)
+    yearly = readings_at_cutoffs(df2, cutoffs, ["CounterId", "Year"], pd.Timedelta(days=15))
+
+    df_year = yearly[[
+        "Object", "Room", "CounterName", "CounterId", "Year", "Date",
+        "Value_Num", "CounterType", "CounterUnit",
+    ]].sort_values(["CounterId", "Year"], ignore_index=True)
     # --- Add delta/prev with reset detection and ResetDetected ---
-    prev_vals = []
-    prev_dates = []
-    deltas = []
-    reset_flags = []
-
-    last_value = {}
-    last_date = {}
-
-    try:
-        vmap = virtual_to_physical
-    except:
-        vmap = {}
-
-    for idx, row in df_year.iterrows():
-        key = row["CounterId"]
-        current_val = row["Value_Num"]
-        current_date = row["Date"]
-
-        if key not in last_value:
-            prev_vals.append(None)
-            prev_dates.append(None)
-            deltas.append(None)
-            reset_flags.append(False)
-            last_value[key] = current_val
-            last_date[key] = current_date
-            continue
-
-        previous_val = last_value[key]
-        previous_date = last_date[key]
-
-        # virtual reset detection
-        virt_reset = detect_virtual_reset(key, previous_val, current_val, vmap)
-
-        if current_val < previous_val or virt_reset:
-            delta = current_val
-            prev_vals.append(None)
-            prev_dates.append(None)
-            reset_flag = True
-        else:
-            delta = current_val - previous_val
-            prev_vals.append(previous_val)
-            prev_dates.append(previous_date)
-            reset_flag = False
-
-        deltas.append(delta)
-        reset_flags.append(reset_flag)
-
-        last_value[key] = current_val
-        last_date[key] = current_date
-
-    df_year["PrevValue"] = prev_vals
-    df_year["PrevDate"] = prev_dates
-    df_year["Delta"] = deltas
-    df_year["ResetDetected"] = reset_flags
+    df_year = df_year.assign(**prev_delta_columns(df_year, "Date"))
 
     # --- Add DeltaPerDay ---
-    delta_per_day = []
-    for idx, row in df_year.iterrows():
-        if row["PrevDate"] is None or row["Delta"] is None:
-            delta_per_day.append(None)
-        else:
-            days = (row["Date"] - row["PrevDate"]).days
-            if days > 0:
-                delta_per_day.append(row["Delta"] / days)
-            else:
-                delta_per_day.append(None)
-    df_year["DeltaPerDay"] = delta_per_day
+    days = (df_year["Date"] - df_year["PrevDate"]).dt.days
+    df_year["DeltaPerDay"] = df_year["Delta"] / days.where(days > 0)
 
     # --- Add Days ---
-    days_list = []
-    for idx, row in df_year.iterrows():
-        if row["PrevDate"] is None:
-            days_list.append(None)
-        else:
-            days_list.append((row["Date"] - row["PrevDate"]).days)
-    df_year["Days"] = days_list
+    df_year["Days"] = days
 
     # --- Add Bemerkung and CreatedAt columns ---
     df_year["Bemerkung"] = ""
-    df_year["CreatedAt"] = pd.Timestamp.now().isoformat()
+    df_year["CreatedAt"] = created_at_column(len(df_year))
 
     # --- qbm/m3 unit division and Bemerkung update ---
-    mask = df_year["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
-    if mask.any():
-        for col in ["Value_Num", "PrevValue", "Delta"]:
-            if col in df_year.columns:
-                df_year.loc[mask, col] = df_year.loc[mask, col] / 1000
-        df_year.loc[mask, "Bemerkung"] = df_year.loc[mask, "Bemerkung"].astype(str) + "Wasser geteilt durch 1000; "
+    water = df_year["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
+    for col in ["Value_Num", "PrevValue", "Delta"]:
+        df_year[col] = df_year[col].mask(water, df_year[col] / 1000)
+    df_year["Bemerkung"] = df_year["Bemerkung"].mask(water, df_year["Bemerkung"] + "Wasser geteilt durch 1000; ")
 
     # --- Column ordering ---
     desired_order = [
@@ -182,168 +203,61 @@ def build_yearly_view(df):
     df_year = df_year.drop(columns=["_virt"])
     # --- Hierarchische Sortierung ---
     # Für virtuelle Zähler und ihre physikalischen Unterzähler eine SortKey erzeugen
-    df_year["_SortKey"] = ""
-
-    # Mapping früher gebaut: virtual_to_physical
-    try:
-        vmap = virtual_to_physical
-    except:
-        vmap = {}
-
-    order_index = 1
-    for cname in sorted(df_year["CounterName"].unique()):
-        subset = df_year[df_year["CounterName"] == cname]
-        cid = subset["CounterId"].iloc[0]
-
-        if cid in vmap:  # virtual
-            base = f"{order_index}.0."
-            df_year.loc[df_year["CounterId"] == cid, "_SortKey"] = base + "0"
-            # Kinder einsortieren
-            sub_idx = 1
-            for child in vmap[cid]:
-                df_year.loc[df_year["CounterId"] == child, "_SortKey"] = base + str(sub_idx)
-                sub_idx += 1
-            order_index += 1
-        else:
-            base = f"{order_index}.0."
-            df_year.loc[df_year["CounterId"] == cid, "_SortKey"] = base + "0"
-            order_index += 1
+    # (vmap: virtual_to_physical aus build_virtual_mapping_by_id)
+    df_year["_SortKey"] = assign_sortkey(df_year, vmap or {})
 
     df_year = df_year.sort_values("_SortKey")
     df_year = df_year.drop(columns=["_SortKey"])
     return df_year
 
 
-def build_monthly_view(df):
-    df2 = df.copy()
-    df2["Date"] = pd.to_datetime(df2["Date_Full"], errors="coerce")
-    df2 = df2.sort_values(["CounterId", "Date"])
+def build_monthly_view(df, vmap=None):
+    # only the columns the view reads: dropna/sort below then copy those, not the whole frame
+    df2 = df[VIEW_SOURCE_COLS].assign(Date=full_dates(df), **counter_categories(df))
+    df2 = df2.dropna(subset=["CounterId", "Date"]).sort_values(["CounterId", "Date"])
     df2["YearMonth"] = df2["Date"].dt.to_period("M")
 
-    monthly = []
-    for cid, group in df2.groupby("CounterId"):
-        min_month = group["YearMonth"].min()
-        max_month = group["YearMonth"].max()
-
-        for ym in pd.period_range(min_month, max_month, freq="M"):
-            month_end = ym.to_timestamp(how="end")
-            g_before = group[group["Date"] <= month_end]
-
-            if not g_before.empty:
-                row = g_before.iloc[-1]
-            else:
-                g_after = group[
-                    (group["Date"] > month_end) &
-                    (group["Date"] <= month_end + pd.Timedelta(days=10))
-                ]
-                if g_after.empty:
-                    continue
-                row = g_after.iloc[0]
-
-            monthly.append({
-                "Object": row["Object"],
-                "Room": row["Room"],
-                "CounterName": row["CounterName"],
-                "CounterId": cid,
-                "YearMonth": str(ym),
-                "Date": row["Date"],
-                "Value_Num": row["Value_Num"],
-                "CounterType": row["CounterType"],
-                "CounterUnit": row["CounterUnit"],
-            })
-
-    df_month = pd.DataFrame(monthly).sort_values(["CounterId", "YearMonth"])
+    # Every month from a counter's first to its last reading: last reading up to
+    # the month end, else the first one up to 10 days later
+    bounds = df2.groupby("CounterId", sort=False, observed=True)["YearMonth"].agg(["min", "max"])
+    # expand [min, max] per counter on the month ordinals, no Period objects per month
+    first = bounds["min"].array.asi8
+    counts = bounds["max"].array.asi8 - first + 1
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    ordinals = np.repeat(first, counts) + np.arange(counts.sum()) - starts
+    months = pd.PeriodIndex.from_ordinals(ordinals, freq="M")
+    cids = bounds.index.repeat(counts)
+    cutoffs = pd.DataFrame({
+        "CounterId": pd.Series(cids, dtype=df2["CounterId"].dtype),
+        "YearMonth": months.astype(str),
+        "Cutoff": months.to_timestamp(how="end").astype(df2["Date"].dtype),
+    })
+    monthly = readings_at_cutoffs(df2, cutoffs, ["CounterId"], pd.Timedelta(days=10))
+
+    df_month = monthly[[
+        "Object", "Room", "CounterName", "CounterId", "YearMonth", "Date",
+        "Value_Num", "CounterType", "CounterUnit",
+    ]].sort_values(["CounterId", "YearMonth"], ignore_index=True)
 
     # --- Add delta/prev with reset detection and ResetDetected ---
-    prev_vals = []
-    prev_dates = []
-    deltas = []
-    reset_flags = []
-
-    last_value = {}
-    last_date = {}
-
-    try:
-        vmap = virtual_to_physical
-    except:
-        vmap = {}
-
-    for idx, row in df_month.iterrows():
-        key = row["CounterId"]
-        current_val = row["Value_Num"]
-        current_date = row["Date"]
-
-        if key not in last_value:
-            # first entry → no delta
-            prev_vals.append(None)
-            prev_dates.append(None)
-            deltas.append(None)
-            reset_flags.append(False)
-            last_value[key] = current_val
-            last_date[key] = current_date
-            continue
-
-        previous_val = last_value[key]
-        previous_date = last_date[key]
-
-        virt_reset = detect_virtual_reset(key, previous_val, current_val, vmap)
-
-        if current_val < previous_val or virt_reset:
-            # reset detected
-            delta = current_val
-            prev_vals.append(None)
-            prev_dates.append(None)
-            reset_flag = True
-        else:
-            delta = current_val - previous_val
-            prev_vals.append(previous_val)
-            prev_dates.append(previous_date)
-            reset_flag = False
-
-        deltas.append(delta)
-        reset_flags.append(reset_flag)
-
-        last_value[key] = current_val
-        last_date[key] = current_date
-
-    df_month["PrevValue"] = prev_vals
-    df_month["PrevDate"] = prev_dates
-    df_month["Delta"] = deltas
-    df_month["ResetDetected"] = reset_flags
+    df_month = df_month.assign(**prev_delta_columns(df_month, "Date"))
 
     # --- Add DeltaPerDay (Verbrauch pro Tag) ---
-    delta_per_day = []
-    for idx, row in df_month.iterrows():
-        if row["PrevDate"] is None or row["Delta"] is None:
-            delta_per_day.append(None)
-        else:
-            days = (row["Date"] - row["PrevDate"]).days
-            if days > 0:
-                delta_per_day.append(row["Delta"] / days)
-            else:
-                delta_per_day.append(None)
-    df_month["DeltaPerDay"] = delta_per_day
+    days = (df_month["Date"] - df_month["PrevDate"]).dt.days
+    df_month["DeltaPerDay"] = df_month["Delta"] / days.where(days > 0)
 
     # --- Add Days (Anzahl Tage zwischen Ablesungen) ---
-    days_list = []
-    for idx, row in df_month.iterrows():
-        if row["PrevDate"] is None:
-            days_list.append(None)
-        else:
-            days_list.append((row["Date"] - row["PrevDate"]).days)
-    df_month["Days"] = days_list
+    df_month["Days"] = days
 
     # --- Add Bemerkung and CreatedAt columns ---
     df_month["Bemerkung"] = ""
-    df_month["CreatedAt"] = pd.Timestamp.now().isoformat()
+    df_month["CreatedAt"] = created_at_column(len(df_month))
 
     # --- qbm/m3 unit division and Bemerkung update ---
-    mask = df_month["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
-    if mask.any():
-        for col in ["Value_Num", "PrevValue", "Delta"]:
-            if col in df_month.columns:
-                df_month.loc[mask, col] = df_month.loc[mask, col] / 1000
-        df_month.loc[mask, "Bemerkung"] = df_month.loc[mask, "Bemerkung"].astype(str) + "Wasser geteilt durch 1000; "
+    water = df_month["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
+    for col in ["Value_Num", "PrevValue", "Delta"]:
+        df_month[col] = df_month[col].mask(water, df_month[col] / 1000)
+    df_month["Bemerkung"] = df_month["Bemerkung"].mask(water, df_month["Bemerkung"] + "Wasser geteilt durch 1000; ")
 
     # --- Column ordering ---
     desired_order = [
@@ -363,32 +277,8 @@ def build_monthly_view(df):
     df_month = df_month.drop(columns=["_virt"])
     # --- Hierarchische Sortierung ---
     # Für virtuelle Zähler und ihre physikalischen Unterzähler eine SortKey erzeugen
-    df_month["_SortKey"] = ""
-
-    # Mapping früher gebaut: virtual_to_physical
-    try:
-        vmap = virtual_to_physical
-    except:
-        vmap = {}
-
-    order_index = 1
-    for cname in sorted(df_month["CounterName"].unique()):
-        subset = df_month[df_month["CounterName"] == cname]
-        cid = subset["CounterId"].iloc[0]
-
-        if cid in vmap:  # virtual
-            base = f"{order_index}.0."
-            df_month.loc[df_month["CounterId"] == cid, "_SortKey"] = base + "0"
-            # Kinder einsortieren
-            sub_idx = 1
-            for child in vmap[cid]:
-                df_month.loc[df_month["CounterId"] == child, "_SortKey"] = base + str(sub_idx)
-                sub_idx += 1
-            order_index += 1
-        else:
-            base = f"{order_index}.0."
-            df_month.loc[df_month["CounterId"] == cid, "_SortKey"] = base + "0"
-            order_index += 1
+    # (vmap: virtual_to_physical aus build_virtual_mapping_by_id)
+    df_month["_SortKey"] = assign_sortkey(df_month, vmap or {})
 
     df_month = df_month.sort_values("_SortKey")
     df_month = df_month.drop(columns=["_SortKey"])
@@ -420,120 +310,101 @@ def extract_art(counter_type: str, counter_name: str) -> str:
         return "strom"
     return ""
 
+def extract_unit_series(counter_names: pd.Series) -> pd.Series:
+    """Vectorized extract_unit over a CounterName column."""
+    names = counter_names.astype("string")
+    return names.str.split(".").str[:2].str.join(".").fillna("")
+
+def extract_art_series(counter_types: pd.Series, counter_names: pd.Series) -> np.ndarray:
+    """Vectorized extract_art over the CounterType/CounterName columns."""
+    text = counter_types.astype(str).str.cat(counter_names.astype(str), sep=" ", na_rep="").str.lower()
+    return np.select(
+        [
+            text.str.contains("wasser|water", na=False),
+            text.str.contains("wärme|waerme|heat", na=False),
+            text.str.contains("strom|electric", na=False),
+        ],
+        ["wasser", "wärme", "strom"],
+        default="",
+    )
+
 def build_summary_table(df_month):
     """
     Builds a clean pivoted summary:
     YearMonth | wasser | wärme | strom | Einheit
     """
-    df2 = df_month.copy()
-    df2["Ablesung"] = df2["Date"].dt.strftime("%Y.%m")
-    df2["Einheit"] = df2["CounterName"].apply(extract_unit)
-    df2["Art"] = df2.apply(lambda r: extract_art(r["CounterType"], r["CounterName"]), axis=1)
+    df2 = df_month.assign(
+        Ablesung=df_month["Date"].dt.strftime("%Y.%m"),
+        Einheit=extract_unit_series(df_month["CounterName"]),
+        Art=extract_art_series(df_month["CounterType"], df_month["CounterName"]),
+    )
 
     summary = (
-        df2.pivot_table(
-            index="Ablesung",
-            columns="Art",
-            values="Value_Num",
-            aggfunc="max"
-        )
+        # Like pivot_table's dropna: only (Ablesung, Art) pairs with a value
+        df2.dropna(subset=["Value_Num"])
+        .groupby(["Ablesung", "Art"], observed=True)["Value_Num"]
+        .max()
+        .unstack("Art")
         .reset_index()
         .rename_axis(None, axis=1)
     )
 
-    einheit_map = df2.groupby("Ablesung")["Einheit"].first()
-    summary["Einheit"] = summary["Ablesung"].map(einheit_map)
+    einheit = df2.groupby("Ablesung", sort=False, observed=True)["Einheit"].first().reset_index()
+    summary = summary.merge(einheit, on="Ablesung", how="left")
 
-    summary = summary.sort_values("Ablesung")
+    summary = summary.sort_values("Ablesung", kind="stable")
     return summary
 
-def add_delta_columns(df):
+def add_delta_columns(df, vmap=None):
     """
     Adds PrevValue, PrevDate, Delta, DeltaPerDay, Days to raw df.
-    Reset detection included.
+    Reset detection included. vmap is virtual_to_physical from
+    build_virtual_mapping_by_id (hierarchical sort).
     """
-    df2 = df.copy()
-    df2["Date_Full"] = pd.to_datetime(df2["Date_Full"], errors="coerce")
-    df2 = df2.sort_values(["CounterId", "Date_Full"])
-
-    prev_vals = []
-    prev_dates = []
-    deltas = []
-    reset_flags = []
-    last_value = {}
-    last_date = {}
-
-    for idx, row in df2.iterrows():
-        key = row["CounterId"]
-        current_val = row.get("Value_Num", None)
-        current_date = row["Date_Full"]
-
-        if key not in last_value:
-            prev_vals.append(None)
-            prev_dates.append(None)
-            deltas.append(None)
-            reset_flags.append(False)
-            last_value[key] = current_val
-            last_date[key] = current_date
-            continue
-
-        previous_val = last_value[key]
-        previous_date = last_date[key]
-
-        if current_val is None or previous_val is None:
-            prev_vals.append(None)
-            prev_dates.append(None)
-            deltas.append(None)
-            reset_flags.append(False)
-        elif current_val < previous_val:
-            reset_flag = True
-            prev_vals.append(None)
-            prev_dates.append(None)
-            deltas.append(current_val)
-            reset_flags.append(reset_flag)
-        else:
-            reset_flag = False
-            prev_vals.append(previous_val)
-            prev_dates.append(previous_date)
-            deltas.append(current_val - previous_val)
-            reset_flags.append(reset_flag)
-
-        last_value[key] = current_val
-        last_date[key] = current_date
-
-    df2["PrevValue"] = prev_vals
-    df2["PrevDate"] = prev_dates
-    df2["Delta"] = deltas
-    df2["ResetDetected"] = reset_flags
-
-    # --- qbm/m3 unit division and Bemerkung update ---
-    mask = df2["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
-    if mask.any():
-        for col in ["Value_Num", "PrevValue", "Delta"]:
-            if col in df2.columns:
-                df2.loc[mask, col] = df2.loc[mask, col] / 1000
-        df2.loc[mask, "Bemerkung"] = df2.loc[mask, "Bemerkung"].astype(str) + "Wasser geteilt durch 1000; "
-
-    delta_per_day = []
-    days_list = []
-    for idx, row in df2.iterrows():
-        if row["PrevDate"] is None or row["Delta"] is None:
-            delta_per_day.append(None)
-            days_list.append(None)
-        else:
-            days = (row["Date_Full"] - row["PrevDate"]).days
-            days_list.append(days if days > 0 else None)
-            if days and days > 0:
-                delta_per_day.append(row["Delta"] / days)
-            else:
-                delta_per_day.append(None)
-
-    df2["DeltaPerDay"] = delta_per_day
-    df2["Days"] = days_list
+    # Deltas and both sorts only need a few columns: compute them on those and
+    # reorder the full frame once at the end (_pos = row position in df)
+    work = df[["CounterName", "CounterId", "CounterType", "CounterUnit", "Value_Num"]]
+    work = work.assign(Date_Full=full_dates(df), _pos=np.arange(len(df)), **counter_categories(work))
+    work = work.sort_values(["CounterId", "Date_Full"])
+
+    delta = prev_delta_columns(work, "Date_Full")
+
+    # --- qbm/m3 unit division ---
+    water = work["CounterUnit"].astype(str).str.lower().isin(["qbm", "m3", "m³", "m^3"])
+    for col in ["PrevValue", "Delta"]:
+        delta[col] = delta[col].mask(water, delta[col] / 1000)
+
+    days = (work["Date_Full"] - delta["PrevDate"]).dt.days
+    days = days.where(days > 0)
+
+    work = work.assign(
+        Value_Num=work["Value_Num"].mask(water, work["Value_Num"] / 1000),
+        **delta,
+        DeltaPerDay=delta["Delta"] / days,
+        Days=days,
+    )
 
-    # --- Add Bemerkung and CreatedAt columns ---
-    df2["Bemerkung"] = ""
-    df2["CreatedAt"] = pd.Timestamp.now().isoformat()
+    # --- Sort with virtual counters first ---
+    work["_virt"] = work["CounterType"].astype(str).str.upper().eq("VIRTUAL").astype(int)
+    work = work.sort_values(["_virt", "CounterName"])
+    # --- Hierarchische Sortierung ---
+    # Für virtuelle Zähler und ihre physikalischen Unterzähler eine SortKey erzeugen
+    # (vmap: virtual_to_physical aus build_virtual_mapping_by_id)
+    work["_SortKey"] = assign_sortkey(work, vmap or {})
+    work = work.sort_values("_SortKey")
+
+    # --- Full frame in final order; delta columns, Bemerkung and CreatedAt in one go ---
+    df2 = df.take(work["_pos"].to_numpy())
+    df2 = df2.assign(
+        **counter_categories(df2),
+        Date_Full=work["Date_Full"].array,
+        Value_Num=work["Value_Num"].array,
+        **{c: work[c].array for c in delta},
+        DeltaPerDay=work["DeltaPerDay"].array,
+        Days=work["Days"].array,
+        Bemerkung="",
+        CreatedAt=created_at_column(len(df2)),
+    )
 
     # --- Column ordering ---
     desired_order = [
@@ -545,67 +416,4 @@ def add_delta_columns(df):
     ]
     cols = [c for c in desired_order if c in df2.columns] + \
            [c for c in df2.columns if c not in desired_order]
-
-    df2 = df2[cols]
-    # --- Sort with virtual counters first ---
-    df2["_virt"] = df2["CounterType"].astype(str).str.upper().eq("VIRTUAL").astype(int)
-    df2 = df2.sort_values(["_virt", "CounterName"])
-    df2 = df2.drop(columns=["_virt"])
-    # --- Hierarchische Sortierung ---
-    # Für virtuelle Zähler und ihre physikalischen Unterzähler eine SortKey erzeugen
-    df2["_SortKey"] = ""
-
-    # Mapping früher gebaut: virtual_to_physical
-    try:
-        vmap = virtual_to_physical
-    except:
-        vmap = {}
-
-    order_index = 1
-    for cname in sorted(df2["CounterName"].unique()):
-        subset = df2[df2["CounterName"] == cname]
-        cid = subset["CounterId"].iloc[0]
-
-        if cid in vmap:  # virtual
-            base = f"{order_index}.0."
-            df2.loc[df2["CounterId"] == cid, "_SortKey"] = base + "0"
-            # Kinder einsortieren
-            sub_idx = 1
-            for child in vmap[cid]:
-                df2.loc[df2["CounterId"] == child, "_SortKey"] = base + str(sub_idx)
-                sub_idx += 1
-            order_index += 1
-        else:
-            base = f"{order_index}.0."
-            df2.loc[df2["CounterId"] == cid, "_SortKey"] = base + "0"
-            order_index += 1
-
-    df2 = df2.sort_values("_SortKey")
-    df2 = df2.drop(columns=["_SortKey"])
-    return df2
-
-def add_table_to_sheet(sheet_name, table_style):
-    if sheet_name not in wb.sheetnames:
-        return
-    wsx = wb[sheet_name]
-    if wsx.max_row < 2 or wsx.max_column < 1:
-        return
-
-    last_col_letter = get_column_letter(wsx.max_column)
-    last_row = wsx.max_row
-    table_range = f"A1:{last_col_letter}{last_row}"
-
-    if sheet_name == "Zählerdaten_Jahr":
-        table_name = "tblehwJahr"
-    elif sheet_name == "Zählerdaten_Monat":
-        table_name = "tblehwMonat"
-    else:
-        table_name = "TblData"
-
-    t = Table(displayName=table_name, ref=table_range)
-    t.tableStyleInfo = TableStyleInfo(
-        name=table_style,
-        showRowStripes=True,
-        showColumnStripes=False
-    )
-    wsx.add_table(t)
+    return df2[cols]
@@ -0,0 +1,29 @@
+import unittest
+
+import pandas as pd
+
+from ehw_export import parse_date_series
+
+
+class ParseDateSeriesTest(unittest.TestCase):
+    def test_mixed_utc_offsets_keep_local_time(self):
+        # DST change (+01:00 / +02:00) next to 'Z', naive and unparsable dates
+        dates = pd.Series([
+            "2024-03-30T10:00:00+01:00",
+            "2024-04-02T10:15:00+02:00",
+            "2024-04-02T00:00:00.000Z",
+            "2024-04-05",
+            "garbage",
+            None,
+        ], dtype=object)
+
+        parsed = parse_date_series(dates)
+
+        self.assertEqual(list(parsed["Date_Full"]),
+                         ["2024-03-30", "2024-04-02", "2024-04-02", "2024-04-05", "", ""])
+        self.assertEqual(list(parsed["Date_Orig"]),
+                         ["30.03.2024 10:00", "02.04.2024 10:15", "02.04.2024", "05.04.2024", "garbage", ""])
+
+
+if __name__ == "__main__":
+    unittest.main()
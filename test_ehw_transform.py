@@ -0,0 +1,63 @@
+import unittest
+
+import pandas as pd
+
+from ehw_transform import add_delta_columns, build_virtual_mapping_by_id, build_yearly_view
+
+
+def _readings(counters):
+    """Two readings per (CounterName, CounterId, CounterType) in the raw export layout."""
+    rows = []
+    for name, cid, ctype in counters:
+        for date, value in (("2023-06-01", 10.0), ("2024-06-01", 20.0)):
+            rows.append({
+                "Object": name.split(".", 1)[0],
+                "Room": name.rsplit(".", 1)[0],
+                "CounterName": name,
+                "CounterType": ctype,
+                "CounterUnit": "kWh",
+                "CounterId": cid,
+                "Date_Full": date,
+                "Value_Num": value,
+            })
+    return pd.DataFrame(rows)
+
+
+class VirtualSortTest(unittest.TestCase):
+    # Z.Child1 sorts after its parent by name, B.Child2 before it
+    COUNTERS = [
+        ("M.Other", "6 SEN 3", "PHYSICAL"),
+        ("Z.Child1", "6 SEN 1", "PHYSICAL"),
+        ("A.Virt", "v-uuid", "VIRTUAL"),
+        ("B.Child2", "6 SEN 2", "PHYSICAL"),
+    ]
+    EXPECTED = ["A.Virt", "Z.Child1", "B.Child2", "M.Other"]
+
+    def counters_json(self):
+        return [
+            {"uuid": "p-uuid-1", "counterId": "6 SEN 1", "counterType": "PHYSICAL"},
+            {"uuid": "p-uuid-2", "counterId": "6 SEN 2", "counterType": "PHYSICAL"},
+            {"uuid": "p-uuid-3", "counterId": "6 SEN 3", "counterType": "PHYSICAL"},
+            {"uuid": "v-uuid", "counterId": None, "counterType": "VIRTUAL",
+             "virtualCounterData": {"masterCounterUuid": "p-uuid-3",
+                                    "counterUuidsToBeAdded": ["p-uuid-1"],
+                                    "counterUuidsToBeSubtracted": ["p-uuid-2", "unknown"]}},
+        ]
+
+    def test_mapping_is_keyed_by_counter_id(self):
+        self.assertEqual(build_virtual_mapping_by_id(self.counters_json()),
+                         {"v-uuid": ["6 SEN 1", "6 SEN 2"]})
+
+    def test_children_follow_their_virtual_parent(self):
+        vmap = build_virtual_mapping_by_id(self.counters_json())
+        df = _readings(self.COUNTERS)
+
+        raw = add_delta_columns(df, vmap)
+        self.assertEqual(list(raw["CounterName"].astype(str).unique()), self.EXPECTED)
+
+        yearly = build_yearly_view(df, vmap)
+        self.assertEqual(list(yearly["CounterName"].astype(str).unique()), self.EXPECTED)
+
+
+if __name__ == "__main__":
+    unittest.main()